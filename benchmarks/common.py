@@ -0,0 +1,53 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+"""
+Helpers shared by the benchmarks that reduce or build trees of generated JSON
+inputs.
+"""
+
+from os.path import abspath, dirname, join
+
+import antlerinator
+
+import picireny
+
+
+benchmarks_dir = dirname(abspath(__file__))
+resources_dir = join(dirname(benchmarks_dir), 'tests', 'resources')
+
+
+def generate_json(records):
+    """
+    Generate a JSON document of `records` objects. (Every object is ~75 bytes
+    long and results in ~45 nodes in the HDD tree.)
+    """
+    items = [f'{{"id": {i}, "name": "item{i}", "tags": ["a", "b", {i % 7}], "ok": true}}' for i in range(max(records, 1))]
+    return '[\n' + ',\n'.join(items) + '\n]\n'
+
+
+def json_format():
+    return {'': {'files': [join(resources_dir, 'JSON.g4')], 'islands': {}, 'replacements': {}}}
+
+
+def build_json(src, *, antlr, lang, work_dir, compact_tree=False):
+    """
+    Build the HDD tree of a JSON document.
+    """
+    return picireny.build_with_antlr4(src, input_format=json_format(), start='json',
+                                      antlr=antlr, lang=lang, work_dir=work_dir, compact_tree=compact_tree)
+
+
+def parse_args(parser):
+    """
+    Parse the command line with the arguments of the ANTLR tool added to the
+    parser.
+    """
+    antlerinator.add_antlr_argument(parser)
+    args = parser.parse_args()
+    antlerinator.process_antlr_argument(args)
+    return args
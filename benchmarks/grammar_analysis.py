@@ -0,0 +1,72 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+"""
+Measure the time of analyzing grammars (i.e., of computing the minimal
+replacements of their rules). By default, the grammar of ANTLRv4 (shipped with
+picireny) and a large generated grammar are analyzed, but any grammars (e.g.,
+those of the grammars-v4 repository) can be given on the command line.
+"""
+
+import time
+
+from argparse import ArgumentParser
+from os.path import abspath, dirname, join
+from tempfile import TemporaryDirectory
+
+from picireny.antlr4.grammar_analyzer import analyze_grammars
+
+
+resources_dir = join(dirname(dirname(abspath(__file__))), 'src', 'picireny', 'antlr4', 'resources')
+
+
+def generate_grammar(path, rules):
+    """
+    Generate a combined grammar of `rules` parser rules, where every rule
+    refers to the next one, so that the replacements have to be propagated
+    through long chains of references (backwards, from the last rule to the
+    first one).
+    """
+    with open(path, 'w') as f:
+        f.write('grammar Generated;\n')
+        for i in range(rules - 1):
+            f.write(f'r{i} : r{i + 1} (\'+\' r{i + 1})* | \'(\' r0 \')\' ;\n')
+        f.write(f'r{rules - 1} : ID | \'(\' r0 \')\' ;\n')
+        f.write('ID : [a-z]+ ;\n'
+                'WS : [ \\t\\r\\n]+ -> skip ;\n')
+
+
+def main():
+    parser = ArgumentParser(description='Measure the time of analyzing grammars.')
+    parser.add_argument('grammars', metavar='FILE', nargs='*',
+                        help='grammar file(s) to analyze together (default: the grammar of ANTLRv4 and a generated grammar)')
+    parser.add_argument('--rules', metavar='N', type=int, default=1000,
+                        help='number of rules in the generated grammar (default: %(default)s)')
+    parser.add_argument('--repeat', metavar='N', type=int, default=3,
+                        help='number of repetitions, the best time is reported (default: %(default)s)')
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp_dir:
+        if args.grammars:
+            grammar_sets = [args.grammars]
+        else:
+            generated = join(tmp_dir, 'Generated.g4')
+            generate_grammar(generated, args.rules)
+            grammar_sets = [[join(resources_dir, g) for g in ['ANTLRv4Lexer.g4', 'ANTLRv4Parser.g4', 'LexBasic.g4']],
+                            [generated]]
+
+        for grammars in grammar_sets:
+            elapsed = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                replacements, _ = analyze_grammars(grammars, {})
+                elapsed.append(time.perf_counter() - start)
+            print(f'{", ".join(grammars)}: {len(replacements)} rules, analysis time: {min(elapsed):.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+"""
+Measure the time of preparing the grammars of an input format with several
+island grammars (i.e., of analyzing the grammars and of generating, compiling
+and loading their parsers). The grammars are prepared either all at once, when
+the first input needs all of them (so that their parsers are generated in
+parallel), or one by one, when every input needs only one new grammar.
+"""
+
+import re
+import time
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from common import parse_args, resources_dir
+
+import picireny
+
+
+def write_format(work_dir, grammars):
+    """
+    Write `grammars` copies of the JSON grammar (with different names) and
+    describe an INI format with their islands: the values starting with `[i,`
+    are parsed with the i-th copy.
+    """
+    with open(join(resources_dir, 'JSON.g4')) as f:
+        json_grammar = f.read()
+
+    input_format = {
+        'ini': {
+            'files': [join(resources_dir, 'INILexer.g4'), join(resources_dir, 'INIParser.g4')],
+            'islands': {'VALUE': '|'.join(f'(?P<json{i}:json>\\[{i},.*)' for i in range(grammars))},
+            'replacements': {'EOL': '\n', 'HEADER': 'a', 'KEY': 'a', 'VALUE': 'a'},
+        },
+    }
+    for i in range(grammars):
+        path = join(work_dir, f'JSON{i}.g4')
+        with open(path, 'w') as f:
+            f.write(re.sub(r'^grammar JSON;', f'grammar JSON{i};', json_grammar, flags=re.MULTILINE))
+        input_format[f'json{i}'] = {'files': [path], 'islands': {}, 'replacements': {}}
+    return input_format
+
+
+def generate_ini(grammar_ids):
+    """
+    Generate an INI document with a JSON value for each of the grammars.
+    """
+    return '[section]\n' + ''.join(f'key{i}: [{i}, "item{i}"]\n' for i in grammar_ids)
+
+
+def prepare(grammars, *, together, antlr, lang):
+    """
+    Build the trees of inputs that need all the grammars, either with a single
+    input or with one input per grammar.
+
+    :return: The elapsed time (in seconds).
+    """
+    with TemporaryDirectory() as work_dir:
+        input_format = write_format(work_dir, grammars)
+        inputs = [generate_ini(range(grammars))] if together else [generate_ini([i]) for i in range(grammars)]
+
+        start = time.perf_counter()
+        for src in inputs:
+            picireny.build_with_antlr4(src, input_format=input_format, start='ini:ini',
+                                       antlr=antlr, lang=lang, work_dir=join(work_dir, 'build'))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser(description='Measure the time of preparing island grammars.')
+    parser.add_argument('--grammars', metavar='N', type=int, default=4,
+                        help='number of island grammars (default: %(default)s)')
+    parser.add_argument('--parser', metavar='LANG', default='python', choices=['python', 'java'],
+                        help='language of the generated parser (%(choices)s; default: %(default)s)')
+    parser.add_argument('--repeat', metavar='N', type=int, default=3,
+                        help='number of repetitions, the best time is reported (default: %(default)s)')
+    args = parse_args(parser)
+
+    # Every measurement runs in a fresh process, so that the parser modules
+    # imported by a measurement are not reused by the next one.
+    for together in [False, True]:
+        times = []
+        for _ in range(args.repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                times.append(executor.submit(prepare, args.grammars, together=together, antlr=args.antlr, lang=args.parser).result())
+        print(f'{"all at once" if together else "one by one":12} {min(times):8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+"""
+Measure the tree traversal overhead of HDDr on large synthetic trees.
+"""
+
+import time
+
+from argparse import ArgumentParser
+
+import picireny
+
+from picireny.hdd_tree import HDDRule, HDDToken, Position
+
+
+def generate_tree(size, *, fanout):
+    """
+    Generate a complete HDD tree of `size` nodes with `fanout` children per
+    rule.
+    """
+    # In breadth-first order, the children of the i-th node are the nodes from
+    # fanout * i + 1 to fanout * (i + 1), nodes without children are tokens.
+    nodes = [HDDRule('r', start=Position(1, i), end=Position(1, i), replace='') if fanout * i + 1 < size
+             else HDDToken('t', 'x', start=Position(1, i), end=Position(1, i + 1), replace='')
+             for i in range(size)]
+    for i in range(1, size):
+        nodes[(i - 1) // fanout].add_child(nodes[i])
+    return nodes[0]
+
+
+def main():
+    parser = ArgumentParser(description='Measure the tree traversal overhead of HDDr.')
+    parser.add_argument('--size', metavar='N', type=int, default=200000,
+                        help='number of tree nodes (default: %(default)s)')
+    parser.add_argument('--fanout', metavar='N', type=int, default=4,
+                        help='number of children of rules (default: %(default)s)')
+    parser.add_argument('--pop-last', dest='pop_first', default=True, action='store_false',
+                        help='pop nodes from the end of the queue (default: pop from the beginning)')
+    parser.add_argument('--append-reversed', default=False, action='store_true',
+                        help='append the children of nodes to the queue in reverse order')
+    parser.add_argument('--compact-tree', default=False, action='store_true',
+                        help='store the tree in compact arrays')
+    args = parser.parse_args()
+
+    tree = generate_tree(args.size, fanout=args.fanout)
+    if args.compact_tree:
+        tree = picireny.compact_tree(tree)
+
+    # No transformations: every node is visited but nothing is tested, so the
+    # measured time is the overhead of the traversal itself.
+    start = time.perf_counter()
+    steps = sum(1 for _ in picireny.hddrmin_steps(tree,
+                                                  reduce_class=None, reduce_config={},
+                                                  tester_class=None, tester_config={},
+                                                  transformations=(),
+                                                  pop_first=args.pop_first, append_reversed=args.append_reversed))
+    elapsed = time.perf_counter() - start
+
+    print(f'nodes: {sum(picireny.info.count(tree).values())}')
+    print(f'visited rules: {steps}')
+    print(f'traversal time: {elapsed:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+"""
+Measure the peak memory usage (RSS of the reducer and of all its worker
+processes) of parallel reduction of a large generated JSON input, with test
+cases written into the test files chunk by chunk or built in memory as a
+whole.
+"""
+
+import os
+import stat
+import sys
+import threading
+import time
+
+from argparse import ArgumentParser
+from os.path import join
+from tempfile import TemporaryDirectory
+
+import picire
+import psutil
+
+from common import build_json, generate_json, parse_args
+
+import picireny
+
+
+def write_tester(path, keep):
+    """
+    Write a tester script that considers a test case interesting if it contains
+    `keep`.
+    """
+    with open(path, 'w') as f:
+        f.write(f'#! {sys.executable}\n'
+                f'import sys\n'
+                f'with open(sys.argv[1]) as f:\n'
+                f'    sys.exit(0 if {keep!r} in f.read() else 1)\n')
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+
+
+class PeakRSS:
+    """
+    Sample the total RSS of the current process and of all its descendants in
+    a background thread, and keep the maximum.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        process = psutil.Process()
+        while not self._stop.is_set():
+            rss = 0
+            for p in [process] + process.children(recursive=True):
+                try:
+                    rss += p.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def main():
+    parser = ArgumentParser(description='Measure the peak memory usage of parallel reduction.')
+    parser.add_argument('--size', metavar='N', type=int, default=4000000,
+                        help='approximate size of the input in bytes (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, default=32,
+                        help='maximum number of test commands to execute in parallel (default: %(default)s)')
+    parser.add_argument('--no-streaming', dest='streaming', default=True, action='store_false',
+                        help='build test cases in memory as a whole (default: write them into the files chunk by chunk)')
+    parser.add_argument('--interval', metavar='SEC', type=float, default=0.05,
+                        help='time between memory samples (default: %(default)s)')
+    args = parse_args(parser)
+
+    # Every generated object is ~75 bytes long.
+    src = generate_json(args.size // 75)
+    with TemporaryDirectory() as work_dir:
+        tree = build_json(src, antlr=args.antlr, lang='python', work_dir=join(work_dir, 'grammar'))
+
+        tester = join(work_dir, 'tester.py')
+        write_tester(tester, '"item7"')
+
+        with PeakRSS(args.interval) as rss:
+            start = time.perf_counter()
+            tree = picireny.reduce(tree,
+                                   hddmin=picireny.hddmin,
+                                   reduce_class=picire.ParallelDD, reduce_config={'proc_num': args.jobs},
+                                   tester_class=picireny.StreamingSubprocessTest if args.streaming else picire.SubprocessTest,
+                                   tester_config={'command_pattern': [tester, '%s'], 'work_dir': join(work_dir, 'tests'),
+                                                  'filename': 'test.json', 'encoding': 'utf-8', 'cleanup': True},
+                                   cache_class=picire.shared_cache_decorator(picireny.LRUContentCache))
+            elapsed = time.perf_counter() - start
+
+    print(f'input size: {len(src)} bytes')
+    print(f'output size: {len(tree.unparse())} bytes')
+    print(f'reduction time: {elapsed:.3f} s')
+    print(f'peak RSS: {rss.peak} bytes')
+
+
+if __name__ == '__main__':
+    main()
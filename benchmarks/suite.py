@@ -0,0 +1,193 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+"""
+Benchmark suite of picireny. Measure the time and the peak memory (of the
+Python allocations, as traced by tracemalloc) of grammar analysis, tree
+building, tree transformations, unparsing and reduction, on generated JSON and
+INI (with JSON island) inputs of increasing size. The results can be saved as
+JSON, e.g., to compare them across versions.
+"""
+
+import gc
+import json
+import pickle
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+from functools import partial
+from os.path import join
+from tempfile import TemporaryDirectory
+
+import picire
+
+from common import generate_json, json_format, parse_args, resources_dir
+
+import picireny
+
+from picireny.antlr4.grammar_analyzer import analyze_grammars
+
+
+def generate_inijson(records):
+    """
+    Generate an INI document of `records` sections with JSON values.
+    """
+    return ''.join(f'[section{i}]\nid: {i}\nitem: [ {i}, "item{i}", {{"tags": ["a", "b"], "ok": true}} ]\n' for i in range(records))
+
+
+def inijson_format():
+    return {
+        'ini': {
+            'files': [join(resources_dir, 'INILexer.g4'), join(resources_dir, 'INIParser.g4')],
+            'islands': {'VALUE': '(?P<json:json>.*)'},
+            'replacements': {'EOL': '\n', 'HEADER': 'a', 'KEY': 'a', 'VALUE': 'a'},
+        },
+        'json': {'files': [join(resources_dir, 'JSON.g4')], 'islands': {}, 'replacements': {}},
+    }
+
+
+formats = {
+    'json': {'generate': generate_json, 'input_format': json_format, 'start': 'json'},
+    'inijson': {'generate': generate_inijson, 'input_format': inijson_format, 'start': 'ini:ini'},
+}
+
+
+class ContainsTest:
+    """
+    In-process tester that considers a test case interesting if it contains a
+    given text (so that the measured reduction time is not dominated by
+    starting test processes).
+    """
+
+    def __init__(self, *, test_builder, keep):
+        self.test_builder = test_builder
+        self.keep = keep
+
+    def __call__(self, config, config_id):
+        return picire.Outcome.FAIL if self.keep in self.test_builder(config) else picire.Outcome.PASS
+
+
+def measure(func, setup=None):
+    """
+    Measure the time and the peak memory of a function. The function is run
+    twice (once timed and once traced, as tracing slows down the execution),
+    both times on a fresh argument created by `setup` (which is not measured).
+
+    :return: Pair of the elapsed time (in seconds) and of the peak memory (in
+        bytes).
+    """
+    arg = setup() if setup else None
+    gc.collect()
+    start = time.perf_counter()
+    func(arg)
+    elapsed = time.perf_counter() - start
+
+    arg = setup() if setup else None
+    gc.collect()
+    tracemalloc.start()
+    func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run_format(name, records, *, antlr, parsers, work_dir, max_reduce_records):
+    """
+    Run the benchmarks of an input format on generated inputs of the given
+    sizes.
+
+    :return: List of the results.
+    """
+    fmt = formats[name]
+    results = []
+
+    def record(benchmark, size, nodes, result):
+        elapsed, peak = result
+        results.append({'format': name, 'benchmark': benchmark, 'records': size, 'nodes': nodes, 'time': elapsed, 'peak': peak})
+        print(f'{name:8} {benchmark:32} {size if size is not None else "-":>8} {nodes if nodes is not None else "-":>9} '
+              f'{elapsed:10.3f} s {peak / 1024 / 1024:10.1f} MiB', flush=True)
+
+    grammars = [fn for grammar in fmt['input_format']().values() for fn in grammar['files']]
+    record('analyze_grammars', None, None, measure(lambda _: analyze_grammars(grammars, {})))
+
+    for lang in parsers:
+        # The grammars are prepared once (by building a small input), so that
+        # the builds only measure parsing and tree building.
+        input_format = fmt['input_format']()
+        lang_work_dir = join(work_dir, name, lang)
+
+        def build(src, input_format=input_format, lang=lang, lang_work_dir=lang_work_dir):
+            return picireny.build_with_antlr4(src, input_format=input_format, start=fmt['start'],
+                                              antlr=antlr, lang=lang, work_dir=lang_work_dir)
+
+        build(fmt['generate'](1))
+        for size in records:
+            src = fmt['generate'](size)
+            tree = build(src)
+            nodes = sum(picireny.info.count(tree).values())
+            record(f'build/{lang}', size, nodes, measure(lambda _, build=build, src=src: build(src)))
+
+            # The rest of the benchmarks only need one tree, which is copied
+            # (via pickling) for every measurement, as they change the tree.
+            if lang != parsers[0]:
+                continue
+            copy_tree = partial(pickle.loads, pickle.dumps(tree))
+
+            for transformation in [picireny.transform.remove_empty_nodes,
+                                   picireny.transform.flatten_recursion,
+                                   picireny.transform.squeeze_tree,
+                                   picireny.transform.skip_unremovable,
+                                   picireny.transform.skip_whitespace]:
+                record(f'transform/{transformation.__name__}', size, nodes, measure(transformation, copy_tree))
+
+            # An identity transformation disables the memoization of the
+            # unparsed texts, thus the whole tree is rendered.
+            record('unparse', size, nodes, measure(lambda tree: tree.unparse(transform=lambda node: node), copy_tree))
+
+            if size > max_reduce_records:
+                continue
+            for hddmin in [picireny.hddmin, picireny.hddrmin]:
+                def reduce(tree, hddmin=hddmin):
+                    hddmin(picireny.transform.squeeze_tree(tree),
+                           reduce_class=picire.DD, reduce_config={},
+                           tester_class=ContainsTest, tester_config={'keep': '"item7"'},
+                           cache=picireny.LRUContentCache())
+                record(hddmin.__name__, size, nodes, measure(reduce, copy_tree))
+
+    return results
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark suite of picireny.')
+    parser.add_argument('--format', metavar='NAME', dest='formats', nargs='+', choices=formats.keys(), default=list(formats.keys()),
+                        help='input formats to benchmark (%(choices)s; default: all)')
+    parser.add_argument('--records', metavar='N', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='sizes of the generated inputs, in number of records (objects or sections) (default: %(default)s)')
+    parser.add_argument('--max-reduce-records', metavar='N', type=int, default=1000,
+                        help='largest input to reduce, in number of records (default: %(default)s)')
+    parser.add_argument('--parser', metavar='LANG', dest='parsers', nargs='+', choices=['python', 'java'], default=['python'],
+                        help='languages of the generated parsers to build trees with (%(choices)s; default: %(default)s) '
+                             '(the rest of the benchmarks use the trees built with the first one)')
+    parser.add_argument('--json', metavar='FILE',
+                        help='save the results to a JSON file')
+    args = parse_args(parser)
+
+    print(f'{"format":8} {"benchmark":32} {"records":>8} {"nodes":>9} {"time":>12} {"peak memory":>14}')
+    results = []
+    with TemporaryDirectory() as work_dir:
+        for name in args.formats:
+            results += run_format(name, sorted(args.records), antlr=args.antlr, parsers=args.parsers,
+                                  work_dir=work_dir, max_reduce_records=args.max_reduce_records)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'version': picireny.__version__, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+"""
+Measure the memory footprint of HDD trees built from generated JSON inputs.
+"""
+
+import gc
+import tracemalloc
+
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+
+from common import build_json, generate_json, parse_args
+
+import picireny
+
+
+def main():
+    parser = ArgumentParser(description='Measure the memory footprint of HDD trees.')
+    parser.add_argument('--size', metavar='N', type=int, default=300000,
+                        help='approximate number of tree nodes (default: %(default)s)')
+    parser.add_argument('--parser', metavar='LANG', default='python', choices=['python', 'java'],
+                        help='language of the generated parser (%(choices)s; default: %(default)s)')
+    parser.add_argument('--compact-tree', default=False, action='store_true',
+                        help='store the tree in compact arrays')
+    args = parse_args(parser)
+
+    # Every generated object results in ~45 nodes in the HDD tree.
+    src = generate_json(args.size // 45)
+    with TemporaryDirectory() as work_dir:
+        # Warm up: build the parser and import the generated modules.
+        build_json(generate_json(1), antlr=args.antlr, lang=args.parser, work_dir=work_dir, compact_tree=args.compact_tree)
+
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        tree = build_json(src, antlr=args.antlr, lang=args.parser, work_dir=work_dir, compact_tree=args.compact_tree)
+        gc.collect()
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    nodes = sum(picireny.info.count(tree).values())
+    print(f'nodes: {nodes}')
+    print(f'tree memory: {after - before} bytes ({(after - before) / nodes:.1f} bytes/node)')
+    print(f'peak memory during building: {peak - before} bytes ({(peak - before) / nodes:.1f} bytes/node)')
+
+
+if __name__ == '__main__':
+    main()
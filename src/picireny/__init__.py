@@ -8,7 +8,11 @@
 from . import cli
 from . import info
 from . import transform
+from .checkpoint import Checkpointer, load_checkpoint
 from .cli import __version__, build_with_antlr4, build_with_srcml, reduce
 from .hdd import hddmin
-from .hddr import hddrmin
+from .hddr import hddrmin, hddrmin_steps
 from .hdd_tree import HDDRule, HDDToken, HDDTree
+from .hdd_tree_store import compact_tree, HDDTreeStore
+from .outcome_cache import LRUContentCache, PersistentContentCache
+from .subprocess_test import StreamingSubprocessTest
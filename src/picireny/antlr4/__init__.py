@@ -5,4 +5,4 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
-from .hdd_tree_builder import create_hdd_tree
+from .hdd_tree_builder import close_parsers, create_hdd_tree
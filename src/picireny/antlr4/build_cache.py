@@ -0,0 +1,115 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import hashlib
+import json
+import logging
+import shutil
+
+from importlib import metadata
+from os import listdir, makedirs, rename
+from os.path import basename, isdir, isfile, join
+from tempfile import mkdtemp
+
+logger = logging.getLogger(__name__)
+
+build_info_file = 'picireny-build.json'
+
+
+def build_key(grammars, resources, replacements, antlr, lang):
+    """
+    Compute the key of a grammar build in the persistent build cache. The key
+    depends on everything that affects the outcome of the build: the contents
+    of the grammar and resource files (which also determine the positions of
+    the injected actions), the predefined replacements, the ANTLR tool, the
+    target language, and the version of picireny.
+
+    :param grammars: List of the grammar files.
+    :param resources: List of the resource files.
+    :param replacements: Dictionary of the predefined replacements.
+    :param antlr: Path to the ANTLR4 tool (Java jar binary).
+    :param lang: The target language of the parser.
+    :return: Hex digest identifying the build.
+    """
+    h = hashlib.sha256()
+
+    def update(data):
+        h.update(len(data).to_bytes(8, 'little'))
+        h.update(data)
+
+    def update_file(fn, *, with_name=True):
+        if with_name:
+            update(basename(fn).encode('utf-8'))
+        with open(fn, 'rb') as f:
+            update(f.read())
+
+    update(metadata.version('picireny').encode('utf-8'))
+    update(lang.encode('utf-8'))
+    update_file(antlr, with_name=False)
+    for fn in grammars:
+        update_file(fn)
+    update(b'')  # Separate grammars from resources.
+    for fn in resources:
+        update_file(fn)
+    update(json.dumps(replacements, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+def load_build(cache_dir, key, out):
+    """
+    Copy the files of a cached grammar build into the output directory.
+
+    :param cache_dir: Path to the persistent build cache.
+    :param key: The key of the build (see build_key).
+    :param out: Output directory.
+    :return: The dictionary stored with the build (see store_build), or None if
+        the build is not in the cache.
+    """
+    entry = join(cache_dir, key)
+    if not isfile(join(entry, build_info_file)):
+        return None
+
+    for fn in listdir(entry):
+        if fn != build_info_file:
+            shutil.copy(join(entry, fn), out)
+    with open(join(entry, build_info_file), 'r', encoding='utf-8') as f:
+        info = json.load(f)
+    logger.debug('Grammar build %s is loaded from cache.', key)
+    return info
+
+
+def store_build(cache_dir, key, out, info):
+    """
+    Save the files of a grammar build into the persistent build cache. Only the
+    regular files of the output directory are saved (i.e., subdirectories, like
+    those of other grammars, are not).
+
+    :param cache_dir: Path to the persistent build cache.
+    :param key: The key of the build (see build_key).
+    :param out: Output directory containing the build.
+    :param info: JSON-serializable dictionary to store with the build.
+    """
+    entry = join(cache_dir, key)
+    if isdir(entry):
+        return
+
+    # Prepare the entry in a temporary directory and move it in place in one
+    # step, so that concurrent runs never see incomplete entries.
+    makedirs(cache_dir, exist_ok=True)
+    tmp_entry = mkdtemp(prefix=f'{key}.', dir=cache_dir)
+    try:
+        for fn in listdir(out):
+            if isfile(join(out, fn)):
+                shutil.copy(join(out, fn), tmp_entry)
+        with open(join(tmp_entry, build_info_file), 'w', encoding='utf-8') as f:
+            json.dump(info, f)
+        rename(tmp_entry, entry)
+        logger.debug('Grammar build %s is saved to cache.', key)
+    except OSError as e:
+        # Another run may have stored the same build in the meantime.
+        logger.debug('Failed to save grammar build %s to cache: %s', key, e)
+        shutil.rmtree(tmp_entry, ignore_errors=True)
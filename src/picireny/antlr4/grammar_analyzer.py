@@ -5,6 +5,8 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
+from collections import deque
+
 from antlr4 import CommonTokenStream, FileStream
 from antlr4.tree import Tree
 
@@ -34,18 +36,35 @@ def analyze_grammars(grammars, replacements):
         """
         Set the minimal replacements of the various subtrees.
 
+        The replacement (and the start intervals) of an element depend only on
+        those of its children (referenced rules are plugged under the
+        referrers as children). Therefore, instead of re-evaluating all
+        elements until nothing changes, an element is re-evaluated only when
+        one of its children has changed.
+
         :param tree: AST-like tree representation built by create_grammar_tree.
         """
-        iterate = True
-        # Iterate until any updates were performed.
-        while iterate:
-            iterate = False
-            for e in tree:
-                # If all of the children have a min set:
-                s = isinstance(e, ANTLRLexerElement) and e.calc_starters()
-                r = e.calc_replacement()
-                if s or r:
-                    iterate = True
+        indices = {id(e): i for i, e in enumerate(tree)}
+        parents = [[] for _ in tree]
+        for i, e in enumerate(tree):
+            for c in e.children:
+                parents[indices[id(c)]].append(i)
+
+        # All elements are evaluated at least once (in the order of the
+        # elements list), and then their parents whenever they change.
+        worklist = deque(range(len(tree)))
+        queued = [True] * len(tree)
+        while worklist:
+            i = worklist.popleft()
+            queued[i] = False
+            e = tree[i]
+            s = isinstance(e, ANTLRLexerElement) and e.calc_starters()
+            r = e.calc_replacement()
+            if s or r:
+                for p in parents[i]:
+                    if not queued[p]:
+                        queued[p] = True
+                        worklist.append(p)
 
     # Only those ParseTrees are present in our tree representation that
     # have real effect on the minimal replacements of the rules.
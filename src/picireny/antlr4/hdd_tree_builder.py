@@ -8,33 +8,51 @@
 import logging
 import re
 import shutil
+import struct
 import sys
 
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
-from os import makedirs, pathsep
+from os import cpu_count, makedirs, pathsep
 from os.path import basename, join
 from pkgutil import get_data
 from string import Template
 from subprocess import CalledProcessError, PIPE, run, STDOUT
-
-import xson
+from threading import Lock
 
 from antlr4 import CommonTokenStream, error, InputStream, Token
 from antlr4.Token import CommonToken
 
+from .build_cache import build_key, load_build, store_build
 from .grammar_analyzer import analyze_grammars
-from .parser_builder import build_grammars
+from .java_parser import JavaParser
+from .parser_builder import generate_grammars, load_grammars
 from ..hdd_tree import HDDRule, HDDToken, Position
 from ..transform import remove_empty_nodes
+from ..traversal import postorder, preorder
 
 
 logger = logging.getLogger(__name__)
 
+# Record types and fields of the tree format of the Java parser.
+_WIRE_STRING = 0
+_WIRE_RULE = 1
+_WIRE_QUANTIFIER = 2
+_WIRE_TOKEN = 3
+_WIRE_HIDDEN_TOKEN = 4
+_WIRE_ERROR_TOKEN = 5
+_WIRE_INT = struct.Struct('>i')
+_WIRE_RULE_FIELDS = struct.Struct('>ii')
+_WIRE_TOKEN_FIELDS = struct.Struct('>iiiiii')
+
 
 class HDDQuantifier(HDDRule):
     """
     Special rule type in the HDD tree to support optional quantifiers.
     """
+    __slots__ = ()
+
     def __init__(self, *, start=None, end=None):
         super().__init__('', start=start, end=end)
 
@@ -43,6 +61,7 @@ class HDDHiddenToken(HDDToken):
     """
     Special token type that represents tokens from hidden channels.
     """
+    __slots__ = ()
 
 
 class HDDErrorToken(HDDToken):
@@ -50,10 +69,34 @@ class HDDErrorToken(HDDToken):
     Special token type that represents unmatched tokens. The minimal replacement
     of such nodes is an empty string.
     """
+    __slots__ = ()
+
     def __init__(self, text, *, start=None, end=None):
         super().__init__('', text, start=start, end=end)
 
 
+def _children(node):
+    return node.children if isinstance(node, HDDRule) else None
+
+
+def _line_starts(text):
+    """
+    Compute the offsets of the beginnings of the lines of a text.
+    """
+    return [0] + [m.end() for m in re.finditer('\n', text)]
+
+
+def _position_at(start, line_starts, offset):
+    """
+    Convert an offset of a text starting at a given position to a position
+    (same as ``start.after(text[0:offset])`` but without scanning the text).
+    """
+    line = bisect_right(line_starts, offset) - 1
+    if line == 0:
+        return Position(start.line, start.column + offset)
+    return Position(start.line + line, offset - line_starts[line])
+
+
 # Override ConsoleErrorListener to suppress parse issues in non-verbose mode.
 class ConsoleListener(error.ErrorListener.ConsoleErrorListener):
     def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
@@ -63,22 +106,52 @@ class ConsoleListener(error.ErrorListener.ConsoleErrorListener):
 error.ErrorListener.ConsoleErrorListener.INSTANCE = ConsoleListener()
 
 
+# The idle Java parser processes of the grammars are kept in the input format
+# (and may be shared by several builds).
+_java_parsers_lock = Lock()
+
+
+def close_parsers(input_format):
+    """
+    Terminate the Java parser processes kept running in an input format (see
+    the keep_parsers argument of create_hdd_tree).
+
+    :param input_format: Dictionary describing the input format.
+    """
+    with _java_parsers_lock:
+        for grammar in input_format.values():
+            for java_parser in grammar.pop('java_parsers', []):
+                java_parser.close()
+
+
 def create_hdd_tree(src, *,
                     input_format, start,
                     antlr, lang='python',
                     hidden_tokens=False,
-                    work_dir):
+                    work_dir, build_cache=None, island_jobs=1, keep_parsers=False):
     """
     Build a tree that the HDD algorithm can work with.
 
     :param src: Input source.
-    :param input_format: Dictionary describing the input format.
+    :param input_format: Dictionary describing the input format. The grammars
+        are prepared for parsing into this dictionary, thus if the same
+        dictionary is used to build the trees of several inputs (with the same
+        antlr, lang and work_dir arguments), the grammars are prepared only
+        once.
     :param start: Name of the start rule in [grammarname:]rulename format.
     :param antlr: Path to the ANTLR4 tool (Java jar binary).
     :param lang: The target language of the parser.
     :param hidden_tokens: Build hidden tokens of the input format into the HDD
         tree.
     :param work_dir: Working directory.
+    :param build_cache: Path to a directory to persistently cache grammar
+        builds in (generated and compiled parsers, and replacements), or None.
+    :param island_jobs: Maximum number of island fragments to parse in
+        parallel. (Only the Java parser can parse in parallel, as it parses in
+        separate processes. The Python parser always parses sequentially.)
+    :param keep_parsers: Keep the Java parser processes running after the tree
+        is built, so that building the trees of further inputs with the same
+        input format does not have to start them again (see close_parsers).
     :return: The root of the created HDD tree.
     """
 
@@ -134,25 +207,43 @@ def create_hdd_tree(src, *,
             logger.error('Java compile failed!\n%s\n', e.output)
             raise
 
-    def prepare_parsing(grammar_name):
+    def prepare_sources(grammar_name):
         """
-        Performs initiative steps needed to parse the input test case (like
-        create directory structures, builds grammars, sets PATH, etc...)
+        Performs initiative steps needed to generate the parser of a grammar
+        (like create directory structures, sets PATH, analyzes and instruments
+        the grammars, etc...), or loads the build of the grammar from the build
+        cache. (The grammar analysis uses the ANTLR runtime, which is not
+        thread-safe, thus grammars must not be prepared in parallel.)
 
         :param grammar_name: Name of the grammar to use for parsing.
+        :return: Dictionary describing the build: its working directory, the
+            replacements, the key to store it with in the build cache, and the
+            names of the lexer, parser and listener classes (or None if the
+            parser has to be generated, see generate_parser).
         """
         grammar = input_format[grammar_name]
         resources = [fn for fn in grammar['files'] if not fn.endswith('.g4')]
         grammar['files'] = [fn for fn in grammar['files'] if fn.endswith('.g4')]
 
-        replacements, action_positions = analyze_grammars(grammar['files'], grammar['replacements'])
-        logger.debug('Replacements are calculated...')
-
         current_workdir = join(work_dir, grammar_name) if grammar_name else work_dir
         makedirs(current_workdir, exist_ok=True)
         if current_workdir not in sys.path:
             sys.path.append(current_workdir)
 
+        if build_cache:
+            cache_key = build_key(grammar['files'], resources, grammar['replacements'], antlr, lang)
+            build = load_build(build_cache, cache_key, current_workdir)
+        else:
+            cache_key, build = None, None
+
+        if build:
+            grammar['files'] = [join(current_workdir, basename(g)) for g in grammar['files']]
+            logger.debug('Target grammars are loaded from the build cache...')
+            return {'workdir': current_workdir, 'cache_key': None, 'classes': build['classes'], 'replacements': build['replacements']}
+
+        replacements, action_positions = analyze_grammars(grammar['files'], grammar['replacements'])
+        logger.debug('Replacements are calculated...')
+
         # Inject actions into the target grammars to help localizing part of the test case that are optional.
         for i, g in enumerate(grammar['files']):
             grammar['files'][i] = join(current_workdir, basename(g))
@@ -161,11 +252,41 @@ def create_hdd_tree(src, *,
         for r in resources:
             shutil.copy(r, current_workdir)
 
-        target_lexer_class, target_parser_class, target_listener_class = build_grammars(tuple(grammar['files']), current_workdir, antlr, lang)
+        return {'workdir': current_workdir, 'cache_key': cache_key, 'classes': None, 'replacements': replacements}
+
+    def generate_parser(grammar_name, build):
+        """
+        Generates (and compiles, if needed) the parser of a prepared grammar,
+        and stores it in the build cache (if any). Only external tools (ANTLR
+        and javac) are run, thus the parsers of several grammars can be
+        generated in parallel.
+
+        :param grammar_name: Name of the grammar to use for parsing.
+        :param build: Description of the build (see prepare_sources).
+        """
+        build['classes'] = generate_grammars(tuple(input_format[grammar_name]['files']), build['workdir'], antlr, lang)
         logger.debug('Target grammars are processed...')
 
         if lang == 'java':
-            compile_java_sources(target_lexer_class, target_parser_class, target_listener_class, current_workdir)
+            compile_java_sources(*build['classes'], build['workdir'])
+
+        if build['cache_key']:
+            store_build(build_cache, build['cache_key'], build['workdir'],
+                        {'classes': list(build['classes']), 'replacements': build['replacements']})
+
+    def prepare_parsing(grammar_name, build):
+        """
+        Loads the generated parser of a grammar and extends it to build HDD
+        trees.
+
+        :param grammar_name: Name of the grammar to use for parsing.
+        :param build: Description of the build (see prepare_sources).
+        """
+        grammar = input_format[grammar_name]
+        replacements = build['replacements']
+        target_lexer_class, target_parser_class, target_listener_class = load_grammars(tuple(build['classes']), lang)
+
+        if lang == 'java':
             input_format[grammar_name].update(lexer=target_lexer_class, parser=target_parser_class, listener=target_listener_class, replacements=replacements)
             return
 
@@ -212,8 +333,20 @@ def create_hdd_tree(src, *,
 
             def trigger_listener(self, event):
                 for listener in self.getParseListeners():
-                    if hasattr(listener, event):
-                        getattr(listener, event)()
+                    handler = getattr(listener, event, None)
+                    if handler:
+                        handler()
+
+            # Only the generic rule events are needed to build the HDD tree,
+            # thus the rule-specific callbacks of the listeners (which are all
+            # no-ops) are not dispatched to.
+            def triggerEnterRuleEvent(self):
+                for listener in self._parseListeners:
+                    listener.enterEveryRule(self._ctx)
+
+            def triggerExitRuleEvent(self):
+                for listener in reversed(self._parseListeners):
+                    listener.exitEveryRule(self._ctx)
 
             def syntax_error_warning(self):
                 if self.getNumberOfSyntaxErrors() > 0:
@@ -227,18 +360,20 @@ def create_hdd_tree(src, *,
             identify parts of the input that are not needed to keep it
             syntactically correct.
             """
-            def __init__(self, parser):
+            def __init__(self, parser, intern):
                 self.parser = parser
+                self.intern = intern
                 self.current_node = None
                 self.root = None
                 self.seen_terminal = False
                 self.island_nodes = []
+                self.recursive_rules = set()
 
             def recursion_enter(self):
                 assert isinstance(self.current_node, HDDRule)
                 node = HDDRule(self.current_node.name)
                 self.current_node.add_child(node)
-                self.current_node.recursive_rule = True
+                self.recursive_rules.add(self.current_node)
                 self.current_node = node
 
             def recursion_push(self):
@@ -249,7 +384,7 @@ def create_hdd_tree(src, *,
                 self.current_node.add_child(first_child)
 
             def recursion_unroll(self):
-                assert self.current_node.recursive_rule
+                assert self.current_node in self.recursive_rules
                 assert len(self.current_node.children) == 1 and self.current_node.name == self.current_node.children[0].name
                 children_to_lift = self.current_node.children[0].children
                 parent = self.current_node.parent
@@ -286,25 +421,31 @@ def create_hdd_tree(src, *,
                 return start, start.after(token.text)
 
             def addToken(self, node, child):
+                token_stream = self.parser.getTokenStream()
+                token_index = node.symbol.tokenIndex
                 if not self.seen_terminal:
-                    hidden_tokens = self.parser.getTokenStream().getHiddenTokensToLeft(node.symbol.tokenIndex, -1) or []
+                    hidden_tokens = token_stream.getHiddenTokensToLeft(token_index, -1) or []
                     for token in hidden_tokens:
                         start, end = self.tokenBoundaries(token)
-                        self.current_node.add_child(HDDHiddenToken(self.parser.symbolicNames[token.type], token.text,
+                        self.current_node.add_child(HDDHiddenToken(self.parser.symbolicNames[token.type], self.intern(token.text),
                                                                    start=start, end=end))
                 self.seen_terminal = True
 
                 self.current_node.add_child(child)
 
-                hidden_tokens = self.parser.getTokenStream().getHiddenTokensToRight(node.symbol.tokenIndex, -1) or []
-                for token in hidden_tokens:
+                # All the tokens between the current one and the next token on
+                # the default channel are hidden, so they can be taken from the
+                # buffer of the stream as is (as getHiddenTokensToRight would
+                # do, but without filtering them one by one).
+                next_index = token_stream.nextTokenOnChannel(token_index + 1, Token.DEFAULT_CHANNEL)
+                for token in token_stream.tokens[token_index + 1:next_index]:
                     start, end = self.tokenBoundaries(token)
-                    self.current_node.add_child(HDDHiddenToken(self.parser.symbolicNames[token.type], token.text,
+                    self.current_node.add_child(HDDHiddenToken(self.parser.symbolicNames[token.type], self.intern(token.text),
                                                                start=start, end=end))
 
             def visitTerminal(self, node):
                 token = node.symbol
-                name, text = (self.parser.symbolicNames[token.type], token.text) if token.type != Token.EOF else ('EOF', '')
+                name, text = (self.parser.symbolicNames[token.type], self.intern(token.text)) if token.type != Token.EOF else ('EOF', '')
                 start, end = self.tokenBoundaries(token)
 
                 child = HDDToken(name, text, start=start, end=end)
@@ -316,7 +457,7 @@ def create_hdd_tree(src, *,
                 if hasattr(node, 'symbol'):
                     token = node.symbol
                     start, end = self.tokenBoundaries(token)
-                    self.addToken(node, HDDErrorToken(token.text, start=start, end=end))
+                    self.addToken(node, HDDErrorToken(self.intern(token.text), start=start, end=end))
 
             def enter_optional(self):
                 quant_node = HDDQuantifier()
@@ -346,60 +487,115 @@ def create_hdd_tree(src, *,
 
     def build_hdd_tree(src, grammar_name, start_rule):
         """
-        Parse the input with the provided ANTLR classes.
+        Parse the input with the provided ANTLR classes, and process the
+        islands of the parsed tree.
 
         :param src: Input source.
         :param grammar_name: Name of the grammar to use for parsing.
         :param start_rule: The name of the start rule of the parser.
         :return: The root of the created HDD tree.
         """
+        tree_root, island_nodes = parse(src, grammar_name, start_rule)
+        process_island_nodes(island_nodes)
+        return tree_root
+
+    def parse(src, grammar_name, start_rule, start=None):
+        """
+        Parse the input with the provided ANTLR classes (without processing
+        the islands). May be called from multiple threads at the same time if
+        the Java parser is used.
+
+        :param src: Input source.
+        :param grammar_name: Name of the grammar to use for parsing.
+        :param start_rule: The name of the start rule of the parser.
+        :param start: Position of the input in the whole test case (if the
+            input is an island fragment), or None.
+        :return: The root of the created HDD tree and the list of its island
+            tokens (paired with the island descriptions of the grammar).
+        """
 
         grammar = input_format[grammar_name]
         island_nodes = []
 
-        def set_replacement(node):
-            if isinstance(node, (HDDQuantifier, HDDErrorToken)):
-                node.replace = ''
-            elif isinstance(node, HDDRule):
-                node.replace = grammar['replacements'][node.name]
-            else:
-                node.replace = grammar['replacements'].get(node.name, node.text)
-
-            if isinstance(node, HDDRule):
-                for child in node.children:
-                    set_replacement(child)
+        def set_replacement(root):
+            for node in preorder(root, _children):
+                if isinstance(node, (HDDQuantifier, HDDErrorToken)):
+                    node.replace = ''
+                elif isinstance(node, HDDRule):
+                    node.replace = grammar['replacements'][node.name]
+                else:
+                    node.replace = grammar['replacements'].get(node.name, node.text)
+                if start:
+                    if node.start:
+                        node.start = node.start.shift(start)
+                    if node.end:
+                        node.end = node.end.shift(start)
 
         logger.debug('Parse input with %s rule', start_rule)
         if lang != 'python':
 
-            def hdd_tree_from_dict(node_dict):
-                # Convert interval dictionaries to Position objects.
-                if 'start' in node_dict:
-                    node_dict['start'] = Position(**node_dict['start'])
-                if 'end' in node_dict:
-                    node_dict['end'] = Position(**node_dict['end'])
-
-                name = node_dict.get('name', None)
-                children = node_dict.pop('children', None)
-                cls = globals()[node_dict.pop('type')]
-                node = cls(**node_dict)
-
-                if children:
-                    for child in children:
-                        node.add_child(hdd_tree_from_dict(child))
-                elif name:
-                    if name in grammar['islands']:
-                        island_nodes.append(node)
-                return node
+            def hdd_tree_from_bytes(data):
+                # Decode the preorder record sequence written by the TreeWriter
+                # of the Java parser (see ExtendedTargetParser.java) using an
+                # explicit stack of the rules whose children are still being
+                # decoded (and the number of their missing children).
+                strings = []
+                stack = []
+                root = None
+                offset = 0
+                while offset < len(data):
+                    kind = data[offset]
+                    offset += 1
+
+                    if kind == _WIRE_STRING:
+                        length, = _WIRE_INT.unpack_from(data, offset)
+                        offset += _WIRE_INT.size
+                        strings.append(intern(data[offset:offset + length].decode('utf-8')))
+                        offset += length
+                        continue
+
+                    if kind in (_WIRE_RULE, _WIRE_QUANTIFIER):
+                        name_id, children_cnt = _WIRE_RULE_FIELDS.unpack_from(data, offset)
+                        offset += _WIRE_RULE_FIELDS.size
+                        name = strings[name_id] if name_id >= 0 else None
+                        node = HDDRule(name) if kind == _WIRE_RULE else HDDQuantifier()
+                    else:
+                        name_id, text_id, start_line, start_column, end_line, end_column = _WIRE_TOKEN_FIELDS.unpack_from(data, offset)
+                        offset += _WIRE_TOKEN_FIELDS.size
+                        name = strings[name_id] if name_id >= 0 else None
+                        text = strings[text_id] if text_id >= 0 else None
+                        token_start, token_end = Position(start_line, start_column), Position(end_line, end_column)
+                        if kind == _WIRE_ERROR_TOKEN:
+                            node = HDDErrorToken(text, start=token_start, end=token_end)
+                        else:
+                            node = (HDDToken if kind == _WIRE_TOKEN else HDDHiddenToken)(name, text, start=token_start, end=token_end)
+                        children_cnt = 0
+
+                    if stack:
+                        parent = stack[-1]
+                        parent[0].add_child(node)
+                        parent[1] -= 1
+                        if parent[1] == 0:
+                            stack.pop()
+                    else:
+                        root = node
+
+                    if children_cnt:
+                        stack.append([node, children_cnt])
+                    elif name:
+                        if name in grammar['islands']:
+                            island_nodes.append(node)
+                return root
 
             try:
-                current_workdir = join(work_dir, grammar_name) if grammar_name else work_dir
-                proc = run(('java', '-classpath', java_classpath(current_workdir), f'Extended{grammar["parser"]}', start_rule),
-                           input=src, stdout=PIPE, stderr=PIPE, universal_newlines=True, cwd=current_workdir, check=True)
-                if proc.stderr:
-                    logger.debug(proc.stderr)
-                result = xson.loads(proc.stdout)
-                tree_root = hdd_tree_from_dict(result)
+                java_parser = acquire_java_parser(grammar_name)
+                try:
+                    tree_data, messages = java_parser.parse(src, start_rule)
+                finally:
+                    release_java_parser(grammar_name, java_parser)
+                if messages:
+                    logger.debug(messages)
+                tree_root = hdd_tree_from_bytes(tree_data)
             except CalledProcessError as e:
                 logger.error('Java parser failed!\n%s\n%s', e.stdout, e.stderr)
                 raise
@@ -407,7 +603,10 @@ def create_hdd_tree(src, *,
             lexer = grammar['lexer'](InputStream(src))
             lexer.addErrorListener(ExtendedErrorListener())
             target_parser = grammar['parser'](CommonTokenStream(lexer))
-            parser_listener = grammar['listener'](target_parser)
+            # The HDD tree is built by the listener, the parse tree of ANTLR
+            # would be built in vain.
+            target_parser.buildParseTrees = False
+            parser_listener = grammar['listener'](target_parser, intern)
             target_parser.addParseListener(parser_listener)
 
             getattr(target_parser, start_rule)()
@@ -416,36 +615,99 @@ def create_hdd_tree(src, *,
             assert parser_listener.root == parser_listener.current_node
             tree_root = parser_listener.root
 
-        # Traverse the HDD tree and set minimal replacements for nodes.
+        # Traverse the HDD tree and set minimal replacements for nodes (and
+        # shift island fragments to their position in the same walk).
         set_replacement(tree_root)
-        process_island_nodes(island_nodes, grammar['islands'])
         logger.debug('Parse done.')
-        return tree_root
-
-    def process_island_nodes(island_nodes, island_format):
-        for node in island_nodes:
-            if not isinstance(island_format[node.name], tuple):
-                rewritten, mapping = rename_regex_groups(island_format[node.name])
-                for new_name, old_name in mapping.items():
-                    grammar_name, rule_name = split_grammar_rule_name(old_name)
-                    mapping[new_name] = (grammar_name, rule_name)
-                    if 'lexer' not in input_format[grammar_name]:
-                        prepare_parsing(grammar_name)
-                island_format[node.name] = (re.compile(rewritten, re.S), mapping)
-
-            new_node = HDDRule(node.name, replace=node.replace)
-            new_node.add_children(build_island_subtree(node, *island_format[node.name]))
-            node.replace_with(new_node)
+        return tree_root, [(node, grammar['islands']) for node in island_nodes]
+
+    def acquire_java_parser(grammar_name):
+        # Parsers are kept running per grammar, so that islands do not start a
+        # new JVM for every parsed input. A parser serves one request at a
+        # time, thus a new one is started if all parsers of the grammar are
+        # busy parsing other islands.
+        with _java_parsers_lock:
+            idle_parsers = input_format[grammar_name].setdefault('java_parsers', [])
+            if idle_parsers:
+                return idle_parsers.pop()
+        current_workdir = join(work_dir, grammar_name) if grammar_name else work_dir
+        return JavaParser(input_format[grammar_name]['parser'], classpath=java_classpath(current_workdir), cwd=current_workdir)
+
+    def release_java_parser(grammar_name, java_parser):
+        with _java_parsers_lock:
+            input_format[grammar_name]['java_parsers'].append(java_parser)
+
+    def island_pattern(name, island_format):
+        if not isinstance(island_format[name], tuple):
+            rewritten, mapping = rename_regex_groups(island_format[name])
+            for new_name, old_name in mapping.items():
+                grammar_name, rule_name = split_grammar_rule_name(old_name)
+                mapping[new_name] = (grammar_name, rule_name)
+            island_format[name] = (re.compile(rewritten, re.S), mapping)
+        return island_format[name]
+
+    def prepare_grammars(grammar_names):
+        # Grammars are prepared on demand, when the first fragment to be
+        # parsed with them is found. The parsers of the grammars needed by the
+        # same level of islands are independent of each other, so they are
+        # generated in parallel (ANTLR and javac are run in separate
+        # processes). The rest of the preparation is sequential, as it uses the
+        # ANTLR runtime and imports the generated modules.
+        grammar_names = [name for name in dict.fromkeys(grammar_names) if 'lexer' not in input_format[name]]
+        builds = {name: prepare_sources(name) for name in grammar_names}
+
+        generated = [name for name, build in builds.items() if build['classes'] is None]
+        if len(generated) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(generated), cpu_count() or 1)) as executor:
+                # Exhaust the results to propagate the errors of the generation.
+                list(executor.map(lambda name: generate_parser(name, builds[name]), generated))
+        else:
+            for name in generated:
+                generate_parser(name, builds[name])
+
+        for name, build in builds.items():
+            prepare_parsing(name, build)
+
+    def process_island_nodes(island_nodes):
+        # Islands are processed level by level: the fragments of all islands
+        # of a level are collected first, so that they can be parsed
+        # concurrently, and then the parsed subtrees (already shifted to their
+        # positions by the parser) are stitched back in the order of the
+        # fragments. The islands found in the fragments make up the next
+        # level.
+        while island_nodes:
+            level = [(node, build_island_subtree(node, *island_pattern(node.name, island_format)))
+                     for node, island_format in island_nodes]
+            fragments = [child for _, children in level for child in children if isinstance(child, tuple)]
+            prepare_grammars(fragment[1] for fragment in fragments)
+            parsed = iter(parse_fragments(lambda fragment: parse(*fragment), fragments))
+
+            island_nodes = []
+            for node, children in level:
+                for i, child in enumerate(children):
+                    if isinstance(child, tuple):
+                        island_root, nested_island_nodes = next(parsed)
+                        children[i] = island_root
+                        island_nodes.extend(nested_island_nodes)
+
+                new_node = HDDRule(node.name, replace=node.replace)
+                new_node.add_children(children)
+                node.replace_with(new_node)
 
     def build_island_subtree(node, pattern, mapping):
         """
-        Process terminal with an island grammar.
+        Split a terminal containing island language into fragments according
+        to the island grammar.
 
         :param node: HDDToken object containing island language.
-        :return: List of HDDTree nodes representing the `children` of node.
+        :return: List representing the `children` of node, with HDDToken
+            objects for the parts of the content not matched by the pattern,
+            and with (src, grammar_name, start_rule, start) tuples for the
+            island fragments to be parsed.
         """
         last_processed = 0
         content = node.text
+        line_starts = _line_starts(content)
         children = []
 
         # Intervals describes a non-overlapping splitting of the content according to the pattern.
@@ -454,66 +716,43 @@ def create_hdd_tree(src, *,
             intervals.extend((g, m.start(g), m.end(g)) for g in list(pattern.groupindex.keys()) if m.start(g) != m.end(g))
         intervals.sort(key=lambda x: (x[1], x[2]))
 
-        def shift_positions(node, start):
-            if node.start:
-                node.start.shift(start)
-            if node.end:
-                node.end.shift(start)
-
-            if isinstance(node, HDDRule):
-                for child in node.children:
-                    shift_positions(child, start)
-
         for interval in intervals:
             # Create simple HDDToken of the substring proceeding a subgroup.
             if last_processed < interval[1]:
-                token_start = node.start.after(content[0:last_processed])
                 token_text = content[last_processed:interval[1]]
                 children.append(HDDToken('', token_text,
-                                         start=token_start,
-                                         end=token_start.after(token_text),
+                                         start=_position_at(node.start, line_starts, last_processed),
+                                         end=_position_at(node.start, line_starts, interval[1]),
                                          replace=token_text))
 
-            # Process an island and save its subtree.
-            island_start = node.start.after(content[0:interval[1]])
-            island_root = build_hdd_tree(src=content[interval[1]:interval[2]],
-                                         grammar_name=mapping[interval[0]][0],
-                                         start_rule=mapping[interval[0]][1])
-            shift_positions(island_root, island_start)
-            children.append(island_root)
+            # Save the island fragment to be parsed.
+            island_start = _position_at(node.start, line_starts, interval[1])
+            children.append((content[interval[1]:interval[2]], *mapping[interval[0]], island_start))
 
             last_processed = interval[2]
 
         # Create simple HDDToken of the substring following the last subgroup if any.
         if last_processed < len(content):
-            token_start = node.start.after(content[0:last_processed])
             token_text = content[last_processed:]
             children.append(HDDToken('', token_text,
-                                     start=token_start,
-                                     end=token_start.after(token_text),
+                                     start=_position_at(node.start, line_starts, last_processed),
+                                     end=_position_at(node.start, line_starts, len(content)),
                                      replace=token_text))
         return children
 
     def calculate_rule_boundaries(node):
-        if isinstance(node, HDDRule):
-            for child in node.children:
-                calculate_rule_boundaries(child)
-
-            node.start = node.children[0].start
-            node.end = node.children[-1].end
+        for rule in postorder(node, _children):
+            if isinstance(rule, HDDRule):
+                rule.start = rule.children[0].start
+                rule.end = rule.children[-1].end
 
         return node
 
     def remove_hidden_tokens(node):
-        if isinstance(node, HDDRule):
-            non_hidden_children = []
-
-            for child in node.children:
-                if not isinstance(child, HDDHiddenToken):
-                    remove_hidden_tokens(child)
-                    non_hidden_children.append(child)
-
-            node.children[:] = non_hidden_children
+        for rule in preorder(node, _children):
+            if isinstance(rule, HDDRule):
+                rule.children[:] = [child for child in rule.children if not isinstance(child, HDDHiddenToken)]
+                rule.invalidate()
 
         return node
 
@@ -589,11 +828,30 @@ def create_hdd_tree(src, *,
             names.insert(0, '')
         return names[0], names[1]
 
+    # Names and texts of tokens are deduplicated to save memory (e.g., the
+    # texts of punctuation tokens are the same all over the tree).
+    strings = {}
+
+    def intern(s):
+        return strings.setdefault(s, s)
+
     start_grammar, start_rule = split_grammar_rule_name(start)
-    prepare_parsing(start_grammar)
-    tree = build_hdd_tree(src=src,
-                          grammar_name=start_grammar,
-                          start_rule=start_rule)
+    prepare_grammars([start_grammar])
+    try:
+        if lang != 'python' and island_jobs > 1:
+            with ThreadPoolExecutor(max_workers=island_jobs) as executor:
+                parse_fragments = executor.map
+                tree = build_hdd_tree(src=src,
+                                      grammar_name=start_grammar,
+                                      start_rule=start_rule)
+        else:
+            parse_fragments = map
+            tree = build_hdd_tree(src=src,
+                                  grammar_name=start_grammar,
+                                  start_rule=start_rule)
+    finally:
+        if not keep_parsers:
+            close_parsers(input_format)
     if not hidden_tokens:
         tree = remove_hidden_tokens(tree)
     tree = remove_empty_nodes(tree)
@@ -0,0 +1,83 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import logging
+
+from subprocess import CalledProcessError, PIPE, Popen
+
+logger = logging.getLogger(__name__)
+
+
+class JavaParser:
+    """
+    Client of a long-lived Java parser process. The process runs the generated
+    Extended<Parser> class in server mode and parses inputs on request, so that
+    parsing many inputs (e.g., islands) with the same grammar does not have to
+    start a new JVM for every input. The process is started lazily, on the
+    first request.
+    """
+
+    def __init__(self, parser_class, *, classpath, cwd):
+        """
+        :param parser_class: Name of the generated parser class.
+        :param classpath: Java class path containing the compiled parser.
+        :param cwd: Working directory of the parser process.
+        """
+        self.cmd = ('java', '-classpath', classpath, f'Extended{parser_class}', '--server')
+        self.cwd = cwd
+        self.proc = None
+
+    def parse(self, src, start_rule):
+        """
+        Parse an input.
+
+        :param src: Input source.
+        :param start_rule: The name of the start rule of the parser.
+        :return: Pair of the HDD tree in the binary format of the parser (see
+            ExtendedTargetParser.java) and the messages of the parser.
+        :raises CalledProcessError: If parsing failed or the parser process
+            terminated unexpectedly.
+        """
+        if self.proc is None:
+            logger.debug('Starting Java parser: %r', self.cmd)
+            # The process outlives this call, it is terminated by close().
+            self.proc = Popen(self.cmd, stdin=PIPE, stdout=PIPE, cwd=self.cwd)  # pylint: disable=consider-using-with
+
+        data = src.encode('utf-8')
+        try:
+            self.proc.stdin.write(f'{start_rule} {len(data)}\n'.encode('utf-8'))
+            self.proc.stdin.write(data)
+            self.proc.stdin.flush()
+            header = self.proc.stdout.readline()
+        except OSError:
+            header = b''
+
+        if not header:
+            self.close()
+            raise CalledProcessError(1, self.cmd, output='', stderr='Java parser process terminated unexpectedly.')
+
+        status, tree_len, messages_len = (int(field) for field in header.split())
+        tree = self.proc.stdout.read(tree_len)
+        messages = self.proc.stdout.read(messages_len).decode('utf-8')
+        if status != 0:
+            raise CalledProcessError(status, self.cmd + (start_rule, ), output='', stderr=messages)
+        return tree, messages
+
+    def close(self):
+        """
+        Terminate the parser process (if running).
+        """
+        if self.proc is None:
+            return
+
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.wait()
+        self.proc.stdout.close()
+        self.proc = None
@@ -7,6 +7,7 @@
 
 import logging
 
+from importlib import invalidate_caches
 from os import listdir
 from os.path import basename, commonprefix, split, splitext
 from subprocess import CalledProcessError, PIPE, run, STDOUT
@@ -26,49 +27,75 @@ def build_grammars(grammars, out, antlr, lang='python'):
     :return: List of references/names of the lexer, parser and listener classes
         of the target.
     """
+    return load_grammars(generate_grammars(grammars, out, antlr, lang), lang)
 
-    # Generate parser and lexer in the target language and return either with
-    # python class ref or the name of java classes.
+
+def generate_grammars(grammars, out, antlr, lang='python'):
+    """
+    Generate lexer and grammar from ANTLRv4 grammar files in the target
+    language, without loading them. (Only the ANTLR tool is run, in a separate
+    process, thus grammars can be generated in parallel threads.)
+
+    :param grammars: Tuple of grammar files.
+    :param out: Output directory.
+    :param antlr: Path to the ANTLR4 tool (Java jar binary).
+    :param lang: The target language of the parser.
+    :return: Tuple of the names of the lexer, parser and listener classes of
+        the target.
+    """
     if lang not in grammar_cache:
         grammar_cache[lang] = {}
     if grammars in grammar_cache[lang]:
         logger.debug('%r is already built with %s target.', grammars, lang)
         return grammar_cache[lang][grammars]
 
+    languages = {
+        'python': {'antlr_arg': '-Dlanguage=Python3', 'ext': 'py', 'listener_format': 'Listener'},
+        'java': {'antlr_arg': '-Dlanguage=Java', 'ext': 'java', 'listener_format': 'BaseListener'},
+    }
+
     try:
-        languages = {
-            'python': {'antlr_arg': '-Dlanguage=Python3', 'ext': 'py', 'listener_format': 'Listener'},
-            'java': {'antlr_arg': '-Dlanguage=Java', 'ext': 'java', 'listener_format': 'BaseListener'},
-        }
+        run(('java', '-jar', antlr, languages[lang]['antlr_arg'], '-o', out) + grammars,
+            stdout=PIPE, stderr=STDOUT, cwd=out, check=True)
+    except CalledProcessError as e:
+        logger.error('Building grammars %r failed!\n%s\n', grammars, e.output)
+        raise
 
-        try:
-            run(('java', '-jar', antlr, languages[lang]['antlr_arg'], '-o', out) + grammars,
-                stdout=PIPE, stderr=STDOUT, cwd=out, check=True)
-        except CalledProcessError as e:
-            logger.error('Building grammars %r failed!\n%s\n', grammars, e.output)
-            raise
+    files = listdir(out)
+    filename = basename(grammars[0])
 
-        files = listdir(out)
-        filename = basename(grammars[0])
+    def file_endswith(end_pattern):
+        f = next(f for f in files if len(commonprefix([filename, f])) > 0 and f.endswith(end_pattern))
+        _, f = split(f)
+        f, _ = splitext(f)
+        return f
 
-        def file_endswith(end_pattern):
-            f = next(f for f in files if len(commonprefix([filename, f])) > 0 and f.endswith(end_pattern))
-            _, f = split(f)
-            f, _ = splitext(f)
-            return f
+    # Extract the name of lexer and parser from their path.
+    lexer = file_endswith(f'Lexer.{languages[lang]["ext"]}')
+    parser = file_endswith(f'Parser.{languages[lang]["ext"]}')
+    # The name of the generated listeners differs if Python or other language target is used.
+    listener = file_endswith(f'{languages[lang]["listener_format"]}.{languages[lang]["ext"]}')
 
-        # Extract the name of lexer and parser from their path.
-        lexer = file_endswith(f'Lexer.{languages[lang]["ext"]}')
-        parser = file_endswith(f'Parser.{languages[lang]["ext"]}')
-        # The name of the generated listeners differs if Python or other language target is used.
-        listener = file_endswith(f'{languages[lang]["listener_format"]}.{languages[lang]["ext"]}')
+    grammar_cache[lang][grammars] = lexer, parser, listener
+    return grammar_cache[lang][grammars]
 
-        if lang == 'python':
-            grammar_cache[lang][grammars] = [getattr(__import__(x, globals(), locals(), [x], 0), x) for x in [lexer, parser, listener]]
-        else:
-            grammar_cache[lang][grammars] = [lexer, parser, listener]
 
-        return grammar_cache[lang][grammars]
-    except Exception as e:
-        logger.error('Exception while loading parser modules', exc_info=e)
-        raise
+def load_grammars(names, lang='python'):
+    """
+    Load the lexer, parser and listener classes of an already built target.
+
+    :param names: Tuple of the names of the lexer, parser and listener classes.
+    :param lang: The target language of the parser.
+    :return: List of references/names of the lexer, parser and listener classes
+        of the target.
+    """
+    if lang == 'python':
+        # The generated modules may have appeared in a directory of sys.path
+        # since the last import.
+        invalidate_caches()
+        try:
+            return [getattr(__import__(x, globals(), locals(), [x], 0), x) for x in names]
+        except Exception as e:
+            logger.error('Exception while loading parser modules', exc_info=e)
+            raise
+    return list(names)
@@ -1,5 +1,5 @@
 /*
- * Copyright (c) 2016-2023 Renata Hodovan, Akos Kiss.
+ * Copyright (c) 2016-2024 Renata Hodovan, Akos Kiss.
  *
  * Licensed under the BSD 3-Clause License
  * <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
@@ -8,8 +8,8 @@
  */
 
 import java.io.*;
+import java.nio.charset.StandardCharsets;
 import java.util.*;
-import javax.xml.stream.*;
 
 import org.antlr.v4.runtime.*;
 import org.antlr.v4.runtime.tree.*;
@@ -45,83 +45,159 @@ public class Extended$parser_class extends $parser_class {
         }
     }
 
+    /**
+     * Parse the input with the given start rule and write the resulting HDD
+     * tree to the output (see TreeWriter for the format).
+     */
+    private static void parse(String startRule, InputStream in, OutputStream out) throws Exception {
+        ExtendedTargetLexer lexer = new ExtendedTargetLexer(CharStreams.fromStream(in));
+        lexer.addErrorListener(new ExtendedErrorListener());
+        CommonTokenStream tokens = new CommonTokenStream(lexer);
+        Extended$parser_class parser = new Extended$parser_class(tokens);
+        ExtendedTargetListener listener = new ExtendedTargetListener(parser);
+
+        parser.addParseListener(listener);
+        Extended$parser_class.class.getMethod(startRule).invoke(parser);
+        parser.syntaxErrorWarning();
+
+        try (TreeWriter w = new TreeWriter(out)) {
+            w.write(listener.root);
+        }
+    }
+
+    /**
+     * Serve parse requests until the end of the standard input. A request is
+     * a header line "<start rule> <length>" followed by the UTF-8 encoded
+     * input of the given length (in bytes). The response is a header line
+     * "<status> <tree length> <message length>" followed by the HDD tree (empty
+     * if status is non-zero) and the UTF-8 encoded messages that would have
+     * been written to the standard error.
+     */
+    private static void serve() throws IOException {
+        DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+        OutputStream out = new BufferedOutputStream(new FileOutputStream(FileDescriptor.out));
+        PrintStream err = System.err;
+
+        String header;
+        while ((header = readLine(in)) != null) {
+            String[] fields = header.split(" ");
+            byte[] src = new byte[Integer.parseInt(fields[1])];
+            in.readFully(src);
+
+            ByteArrayOutputStream tree = new ByteArrayOutputStream();
+            ByteArrayOutputStream messages = new ByteArrayOutputStream();
+            int status = 0;
+            System.setErr(new PrintStream(messages, true, "UTF-8"));
+            try {
+                parse(fields[0], new ByteArrayInputStream(src), tree);
+            } catch (Exception e) {
+                e.printStackTrace(System.err);
+                tree.reset();
+                status = 1;
+            } finally {
+                System.err.flush();
+                System.setErr(err);
+            }
+
+            out.write((status + " " + tree.size() + " " + messages.size() + "\n").getBytes(StandardCharsets.US_ASCII));
+            tree.writeTo(out);
+            messages.writeTo(out);
+            out.flush();
+        }
+    }
+
+    private static String readLine(InputStream in) throws IOException {
+        ByteArrayOutputStream line = new ByteArrayOutputStream();
+        int c;
+        while ((c = in.read()) != '\n') {
+            if (c < 0)
+                return null;
+            line.write(c);
+        }
+        return line.toString("UTF-8");
+    }
+
     public static void main(String[] args) {
         try {
-            ExtendedTargetLexer lexer = new ExtendedTargetLexer(CharStreams.fromStream(System.in));
-            lexer.addErrorListener(new ExtendedErrorListener());
-            CommonTokenStream tokens = new CommonTokenStream(lexer);
-            Extended$parser_class parser = new Extended$parser_class(tokens);
-            ExtendedTargetListener listener = new ExtendedTargetListener(parser);
-
-            parser.addParseListener(listener);
-            Extended$parser_class.class.getMethod(args[0]).invoke(parser);
-            parser.syntaxErrorWarning();
-
-            try (XsonStreamWriter w = new XsonStreamWriter(System.out)) {
-                w.write(null, listener.root);
-            }
+            if (args[0].equals("--server"))
+                serve();
+            else
+                parse(args[0], System.in, System.out);
         } catch(Exception e) {
             e.printStackTrace(System.err);
             System.exit(1);
         }
     }
 
-    private static interface XsonObject {
-        public void writeXsonMembers(XsonStreamWriter w) throws XMLStreamException;
-    }
-
     /**
-     * XsonStreamWriter is a partial implementation for writing JSONx documents.
-     * It only implements the minimum required to dump HDDNode objects.
+     * TreeWriter writes HDD trees in a compact binary format: a sequence of
+     * records, each starting with a type byte and followed by big-endian
+     * 32-bit integers.
+     *
+     * - STRING records (length, followed by UTF-8 bytes) define the entries of
+     *   the string table, in order. Strings are defined right before their
+     *   first use.
+     * - Rule records (name, number of children) and token records (name,
+     *   text, start line, start column, end line, end column) describe the
+     *   nodes of the tree in preorder. Names and texts are indices into the
+     *   string table (-1 for null).
      */
-    private static class XsonStreamWriter implements AutoCloseable {
-        public static final String JSONX_PREFIX = "json";
-        public static final String JSONX_NS_URI = "http://www.ibm.com/xmlns/prod/2009/jsonx";
-
-        private XMLStreamWriter w;
-
-        public XsonStreamWriter(OutputStream o) throws XMLStreamException {
-            XMLOutputFactory factory = XMLOutputFactory.newInstance();
-            factory.setProperty(XMLOutputFactory.IS_REPAIRING_NAMESPACES, true);
-            w = factory.createXMLStreamWriter(o);
-            w.setPrefix(JSONX_PREFIX, JSONX_NS_URI);
+    private static class TreeWriter implements AutoCloseable {
+        public static final int STRING = 0;
+        public static final int RULE = 1;
+        public static final int QUANTIFIER = 2;
+        public static final int TOKEN = 3;
+        public static final int HIDDEN_TOKEN = 4;
+        public static final int ERROR_TOKEN = 5;
+
+        private DataOutputStream out;
+        private HashMap<String, Integer> strings;
+
+        public TreeWriter(OutputStream o) {
+            out = new DataOutputStream(new BufferedOutputStream(o));
+            strings = new HashMap<String, Integer>();
         }
 
-        public void write(String name, XsonObject value) throws XMLStreamException {
-            w.writeStartElement(JSONX_PREFIX, "object", JSONX_NS_URI);
-            if (name != null)
-                w.writeAttribute("name", name);
-            value.writeXsonMembers(this);
-            w.writeEndElement();
+        public int string(String s) throws IOException {
+            if (s == null)
+                return -1;
+            Integer id = strings.get(s);
+            if (id == null) {
+                byte[] bytes = s.getBytes(StandardCharsets.UTF_8);
+                out.writeByte(STRING);
+                out.writeInt(bytes.length);
+                out.write(bytes);
+                id = strings.size();
+                strings.put(s, id);
+            }
+            return id;
         }
 
-        public void write(String name, Iterable<? extends XsonObject> value) throws XMLStreamException {
-            w.writeStartElement(JSONX_PREFIX, "array", JSONX_NS_URI);
-            if (name != null)
-                w.writeAttribute("name", name);
-            for (XsonObject o : value)
-                write(null, o);
-            w.writeEndElement();
+        public void writeInt(int value) throws IOException {
+            out.writeInt(value);
         }
 
-        public void write(String name, int value) throws XMLStreamException {
-            w.writeStartElement(JSONX_PREFIX, "number", JSONX_NS_URI);
-            if (name != null)
-                w.writeAttribute("name", name);
-            w.writeCharacters(Integer.toString(value));
-            w.writeEndElement();
+        public void writeType(int type) throws IOException {
+            out.writeByte(type);
         }
 
-        public void write(String name, String value) throws XMLStreamException {
-            w.writeStartElement(JSONX_PREFIX, "string", JSONX_NS_URI);
-            if (name != null)
-                w.writeAttribute("name", name);
-            w.writeCharacters(value);
-            w.writeEndElement();
+        public void write(ExtendedTargetListener.HDDNode root) throws IOException {
+            // Iterate instead of recursing to support arbitrarily deep trees.
+            ArrayDeque<ExtendedTargetListener.HDDNode> stack = new ArrayDeque<ExtendedTargetListener.HDDNode>();
+            stack.push(root);
+            while (!stack.isEmpty()) {
+                ExtendedTargetListener.HDDNode node = stack.pop();
+                node.write(this);
+                if (node instanceof ExtendedTargetListener.HDDRule) {
+                    ArrayList<ExtendedTargetListener.HDDNode> children = ((ExtendedTargetListener.HDDRule)node).children;
+                    for (int i = children.size() - 1; i >= 0; i--)
+                        stack.push(children.get(i));
+                }
+            }
         }
 
-        public void close() throws XMLStreamException {
-            w.close();
+        public void close() throws IOException {
+            out.flush();
         }
     }
 
@@ -159,7 +235,7 @@ public class Extended$parser_class extends $parser_class {
         private HDDRule root;
         private boolean seen_terminal;
 
-        private static class Position implements XsonObject {
+        private static class Position {
             public int line;
             public int column;
 
@@ -185,14 +261,9 @@ public class Extended$parser_class extends $parser_class {
                     fromIndex = index + 1;
                 }
             }
-
-            public void writeXsonMembers(XsonStreamWriter w) throws XMLStreamException {
-                w.write("line", line);
-                w.write("column", column);
-            }
         }
 
-        private static abstract class HDDNode implements XsonObject {
+        private static abstract class HDDNode {
             public String name;
             public HDDRule parent;
             public Position start;
@@ -205,15 +276,7 @@ public class Extended$parser_class extends $parser_class {
                 end = null;
             }
 
-            public void writeXsonMembers(XsonStreamWriter w) throws XMLStreamException {
-                w.write("type", getClass().getSimpleName());
-                if (name != null)
-                    w.write("name", name);
-                if (start != null)
-                    w.write("start", start);
-                if (end != null)
-                    w.write("end", end);
-            }
+            public abstract void write(TreeWriter w) throws IOException;
         }
 
         private static class HDDRule extends HDDNode {
@@ -231,9 +294,15 @@ public class Extended$parser_class extends $parser_class {
                 node.parent = this;
             }
 
-            public void writeXsonMembers(XsonStreamWriter w) throws XMLStreamException {
-                super.writeXsonMembers(w);
-                w.write("children", children);
+            protected int type() {
+                return TreeWriter.RULE;
+            }
+
+            public void write(TreeWriter w) throws IOException {
+                int nameId = w.string(name);
+                w.writeType(type());
+                w.writeInt(nameId);
+                w.writeInt(children.size());
             }
         }
 
@@ -247,9 +316,20 @@ public class Extended$parser_class extends $parser_class {
                 end = _end;
             }
 
-            public void writeXsonMembers(XsonStreamWriter w) throws XMLStreamException {
-                super.writeXsonMembers(w);
-                w.write("text", text);
+            protected int type() {
+                return TreeWriter.TOKEN;
+            }
+
+            public void write(TreeWriter w) throws IOException {
+                int nameId = w.string(name);
+                int textId = w.string(text);
+                w.writeType(type());
+                w.writeInt(nameId);
+                w.writeInt(textId);
+                w.writeInt(start.line);
+                w.writeInt(start.column);
+                w.writeInt(end.line);
+                w.writeInt(end.column);
             }
         }
 
@@ -257,18 +337,30 @@ public class Extended$parser_class extends $parser_class {
             public HDDQuantifier() {
                 super(null);
             }
+
+            protected int type() {
+                return TreeWriter.QUANTIFIER;
+            }
         }
 
         private static class HDDHiddenToken extends HDDToken {
             public HDDHiddenToken(String _name, String _text, Position _start, Position _end) {
                 super(_name, _text, _start, _end);
             }
+
+            protected int type() {
+                return TreeWriter.HIDDEN_TOKEN;
+            }
         }
 
         private static class HDDErrorToken extends HDDToken {
             public HDDErrorToken(String _text, Position _start, Position _end) {
                 super(null, _text, _start, _end);
             }
+
+            protected int type() {
+                return TreeWriter.ERROR_TOKEN;
+            }
         }
 
         public ExtendedTargetListener(Parser _parser) {
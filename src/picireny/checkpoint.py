@@ -0,0 +1,174 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import logging
+import pickle
+import time
+
+from os import makedirs, replace
+from os.path import dirname
+
+from .hdd_tree import HDDRule, HDDTree
+from .traversal import preorder
+
+logger = logging.getLogger(__name__)
+
+# Attributes of the nodes that are not saved as they are: the links of the
+# tree are saved as indices, and the memoized values are dropped.
+_LINKS = ('parent', 'children')
+_MEMOS = ('_unparsed', '_fingerprint')
+
+
+def _children(node):
+    return node.children if isinstance(node, HDDRule) else None
+
+
+def _flatten_tree(hdd_tree):
+    """
+    Describe the nodes of a tree in a flat list (so that pickling it does not
+    recurse as deep as the tree).
+
+    :param hdd_tree: The root of the tree.
+    :return: Pair of the list of nodes (in preorder) and the list of their
+        descriptions (class, index of parent, and attributes), or None if the
+        tree is stored compactly (which is flat already).
+    """
+    if getattr(hdd_tree, '_store', None) is not None:
+        return None
+
+    nodes = list(preorder(hdd_tree, _children))
+    index = {id(node): i for i, node in enumerate(nodes)}
+    records = []
+    for node in nodes:
+        cls = type(node)
+        fields = {slot: getattr(node, slot)
+                  for c in cls.__mro__ for slot in c.__dict__.get('__slots__', ())
+                  if slot not in _LINKS and slot not in _MEMOS}
+        records.append((cls, index[id(node.parent)] if node is not hdd_tree else -1, fields))
+    return nodes, records
+
+
+def _unflatten_tree(records):
+    """
+    Rebuild the nodes of a tree from their flat descriptions (see
+    _flatten_tree).
+
+    :param records: The list of the descriptions of the nodes.
+    :return: The list of the nodes (in preorder, the first one is the root).
+    """
+    nodes = []
+    for cls, parent, fields in records:
+        node = cls.__new__(cls)
+        for attr, value in fields.items():
+            setattr(node, attr, value)
+        if isinstance(node, HDDRule):
+            node.children = []
+            for memo in _MEMOS:
+                setattr(node, memo, None)
+        if parent >= 0:
+            node.parent = nodes[parent]
+            nodes[parent].children.append(node)
+        else:
+            node.parent = None
+        nodes.append(node)
+    return nodes
+
+
+class _NodePickler(pickle.Pickler):
+    """
+    Pickler that saves references to the nodes of a flattened tree as indices.
+    """
+
+    def __init__(self, file, nodes):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.index = {id(node): i for i, node in enumerate(nodes)}
+
+    def persistent_id(self, obj):
+        return self.index.get(id(obj)) if isinstance(obj, HDDTree) else None
+
+
+class _NodeUnpickler(pickle.Unpickler):
+    """
+    Unpickler that resolves the node references saved by _NodePickler (once
+    the nodes are set).
+    """
+
+    def __init__(self, file):
+        super().__init__(file)
+        self.nodes = []
+
+    def persistent_load(self, pid):
+        return self.nodes[pid]
+
+
+class Checkpointer:
+    """
+    Save the state of a reduction session periodically, so that it can be
+    resumed after an interruption (see load_checkpoint). The state is saved
+    together with the tree, thus the nodes referenced by the state (e.g., the
+    queue of HDDr) stay connected to the tree when loaded. The nodes of the
+    tree are saved as a flat list, thus trees of any depth can be saved.
+    """
+
+    def __init__(self, path, *, key, interval=0):
+        """
+        :param path: Path to the checkpoint file.
+        :param key: String identifying the reduction session (e.g., the hash of
+            the input), to prevent resuming a different session.
+        :param interval: Minimum number of seconds between two saves.
+        """
+        self.path = path
+        self.key = key
+        self.interval = interval
+        self.last = time.monotonic()
+
+    def __call__(self, hdd_tree, state):
+        """
+        Save the tree and the state of the reduction if the interval has
+        elapsed since the last save.
+
+        :param hdd_tree: The root of the (partially reduced) tree.
+        :param state: Picklable object describing where to resume from.
+        """
+        now = time.monotonic()
+        if now - self.last < self.interval:
+            return
+
+        makedirs(dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        nodes, tree = _flatten_tree(hdd_tree) or ([], hdd_tree)
+        with open(tmp_path, 'wb') as f:
+            # The same pickler saves the tree and the state, so that objects
+            # shared by them (e.g., the store of a compact tree) are saved once.
+            pickler = _NodePickler(f, nodes)
+            pickler.dump((self.key, tree))
+            pickler.dump(state)
+        replace(tmp_path, self.path)
+        self.last = time.monotonic()
+        logger.debug('Checkpoint saved to %s (in %.3fs).', self.path, self.last - now)
+
+
+def load_checkpoint(path, *, key):
+    """
+    Load the tree and the state of a reduction session saved by Checkpointer.
+
+    :param path: Path to the checkpoint file.
+    :param key: String identifying the reduction session.
+    :return: Pair of the root of the tree and the state of the reduction.
+    :raises ValueError: If the checkpoint belongs to another session.
+    """
+    with open(path, 'rb') as f:
+        unpickler = _NodeUnpickler(f)
+        saved_key, tree = unpickler.load()
+        if saved_key != key:
+            raise ValueError(f'Checkpoint {path} belongs to a different reduction session.')
+        if isinstance(tree, list):
+            unpickler.nodes = _unflatten_tree(tree)
+            tree = unpickler.nodes[0]
+        state = unpickler.load()
+    logger.info('Checkpoint loaded from %s', path)
+    return tree, state
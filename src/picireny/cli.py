@@ -5,12 +5,20 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
+import hashlib
 import json
+import time
 
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from functools import partial
 from importlib import metadata
-from os.path import abspath, dirname, exists, join, realpath
-from shutil import rmtree
+from os import listdir, makedirs, remove, replace
+from os.path import abspath, dirname, exists, isdir, isfile, join, realpath
+from shutil import move, rmtree
+from subprocess import SubprocessError
+from threading import Lock
 
 import antlerinator
 import inators
@@ -18,7 +26,8 @@ import picire
 
 from inators import log as logging
 
-from . import filter, hdd, hddr, hoist, info, prune, transform
+from . import filter, hdd, hdd_tree_store, hddr, hoist, info, outcome_cache, prune, subprocess_test, transform
+from .checkpoint import Checkpointer, load_checkpoint
 
 logger = logging.getLogger('picireny')
 __version__ = metadata.version(__package__)
@@ -94,6 +103,11 @@ def process_antlr4_args(args):
             except ValueError as e:
                 raise ValueError(f'Invalid input format definition: The content of {args.replacements} is not a valid JSON object.') from e
 
+    # The grammars are prepared into the input format when a tree is built,
+    # thus the description of the format is saved for identifying the
+    # reduction sessions of later inputs (in batch or server mode).
+    args.input_format_id = json.dumps(args.input_format, sort_keys=True)
+
 
 def process_srcml_args(args):
     if not args.srcml_language:
@@ -112,7 +126,151 @@ def process_args(args):
     elif args.builder == 'srcml':
         process_srcml_args(args)
 
+    if args.batch and args.serve:
+        raise ValueError('Batch mode and server mode cannot be used together.')
+    if args.batch:
+        process_batch_args(args)
+    elif args.serve:
+        process_serve_args(args)
+    else:
+        process_input_args(args)
+
+
+def process_batch_args(args):
+    args.input = realpath(args.input)
+    if not isdir(args.input):
+        raise ValueError(f'Input directory does not exist: {args.input}')
+
+    inputs = sorted(fn for fn in listdir(args.input) if not fn.startswith('.') and isfile(join(args.input, fn)))
+    if not inputs:
+        raise ValueError(f'Input directory contains no test cases: {args.input}')
+
+    args.out = realpath(args.out if args.out else f'{args.input}.{time.strftime("%Y%m%d_%H%M%S")}')
+
+    # The inputs reduced at the same time share the budget of parallel jobs.
+    args.batch_jobs = max(1, min(args.batch_jobs, len(inputs)))
+    jobs = max(1, args.jobs // args.batch_jobs)
+
+    # All inputs are processed up front, so that invalid inputs are reported
+    # before any reduction starts.
+    args.batch_inputs = [process_job_args(args, join(args.input, fn), join(args.out, fn), jobs=jobs) for fn in inputs]
+
+
+def process_serve_args(args):
+    args.input = realpath(args.input)
+    if not isdir(args.input):
+        raise ValueError(f'Spool directory does not exist: {args.input}')
+
+    args.out = realpath(args.out if args.out else f'{args.input}.{time.strftime("%Y%m%d_%H%M%S")}')
+    args.batch_jobs = max(1, args.batch_jobs)
+
+
+def process_job_args(args, path, out, *, jobs):
+    """
+    Process the arguments of one input of a batch or of a server, which share
+    all arguments but the input and the output directory.
+
+    :param args: Processed command line arguments of the batch or server.
+    :param path: Path to the input.
+    :param out: Output directory of the input.
+    :param jobs: Maximum number of tests to execute in parallel.
+    :return: Processed command line arguments of the input.
+    """
+    input_args = copy(args)
+    input_args.input = path
+    input_args.out = out
+    input_args.jobs = jobs
+    process_input_args(input_args)
+    return input_args
+
+
+def process_picire_args(args, *, own_cache):
+    """
+    Process the arguments inherited from picire.
+
+    :param args: Command line arguments.
+    :param own_cache: Boolean denoting whether picireny replaces the cache
+        chosen by picire.
+    """
+    if not own_cache:
+        picire.cli.process_args(args)
+        return
+
+    # In parallel mode, picire starts the manager process of the shared cache
+    # that it chooses, which would never be used if picireny replaces the
+    # cache. Thus, the arguments are processed by picire as if the reduction
+    # was sequential (when no cache is shared), and the parallel reducer is
+    # chosen afterwards as picire would do.
+    cache_name, parallel = args.cache, args.parallel
+    args.cache, args.parallel = 'none', False
     picire.cli.process_args(args)
+    args.cache, args.parallel = cache_name, parallel
+    if not parallel:
+        return
+
+    if args.combine_loops:
+        args.reduce_class = picire.CombinedParallelDD
+        args.reduce_config = {'config_iterator': picire.CombinedIterator(args.reduce_config['subset_first'],
+                                                                         args.reduce_config['subset_iterator'],
+                                                                         args.reduce_config['complement_iterator']),
+                              'split': args.reduce_config['split']}
+    else:
+        args.reduce_class = picire.ParallelDD
+    args.reduce_config.update(proc_num=args.jobs, max_utilization=args.max_utilization)
+
+
+def process_input_args(args):
+    # Content-based outcomes are cached by the hash of the content, and the
+    # cache is kept across all levels, iterations and phases of HDD. If an
+    # outcome store is given, the outcomes are also kept across runs.
+    own_cache = bool(args.outcome_store) or args.cache == 'content'
+    process_picire_args(args, own_cache=own_cache)
+
+    # Test cases are written into the files of the tests chunk by chunk, and
+    # are not built in memory as a whole.
+    args.tester_class = subprocess_test.StreamingSubprocessTest
+
+    args.cache_config = {}
+    if args.outcome_store:
+        args.outcome_store = realpath(args.outcome_store)
+        args.cache = outcome_cache.PersistentContentCache
+        args.cache_config = {'path': args.outcome_store, 'tester_id': tester_identity(args), 'max_size': args.cache_limit}
+    elif own_cache:
+        args.cache = outcome_cache.LRUContentCache
+        args.cache_config = {'max_size': args.cache_limit}
+    if own_cache and args.parallel:
+        args.cache = picire.shared_cache_decorator(args.cache)
+
+    args.checkpoint_file = join(args.out, 'checkpoint.pickle')
+    args.session_id = session_identity(args)
+
+
+def tester_identity(args):
+    # The outcome of a test depends on the tester script and on how it is
+    # invoked, so stored outcomes are only valid for the very same setup.
+    h = hashlib.sha256()
+    h.update(json.dumps([args.tester_config['command_pattern'],
+                         args.tester_config['filename'],
+                         args.tester_config['encoding']]).encode('utf-8'))
+    with open(args.test, 'rb') as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+
+def session_identity(args):
+    # A checkpoint can only be resumed by a session that reduces the same input
+    # the same way (with the same tree building and reduction phases).
+    session = [args.builder, args.compact_tree, args.flatten_recursion, args.squeeze_tree, args.skip_unremovable, args.skip_whitespace,
+               args.hdd, args.phase, args.hdd_star]
+    if args.builder == 'antlr4':
+        session += [args.start, args.input_format_id, args.build_hidden_tokens]
+    elif args.builder == 'srcml':
+        session += [args.srcml_language]
+
+    h = hashlib.sha256()
+    h.update(json.dumps(session).encode('utf-8'))
+    h.update(args.src.encode('utf-8'))
+    return h.hexdigest()
 
 
 def log_tree(title, hdd_tree):
@@ -129,7 +287,7 @@ def build_with_antlr4(src, *,
                       input_format, start,
                       antlr, lang='python',
                       build_hidden_tokens=False,
-                      work_dir):
+                      work_dir, build_cache=None, island_jobs=1, keep_parsers=False, compact_tree=False):
     """
     Execute ANTLRv4-based tree building part of picireny as if invoked from
     command line, however, control its behaviour not via command line arguments
@@ -143,6 +301,14 @@ def build_with_antlr4(src, *,
     :param build_hidden_tokens: Build hidden tokens of the input format into the
         HDD tree.
     :param work_dir: Path to a working directory.
+    :param build_cache: Path to a directory to persistently cache grammar
+        builds in across runs, or None.
+    :param island_jobs: Maximum number of island fragments to parse in
+        parallel (with the Java parser only).
+    :param keep_parsers: Keep the Java parser processes running for building
+        further trees with the same input format.
+    :param compact_tree: Boolean to enable storing the built tree in compact
+        arrays.
     :return: The built HDD tree.
     """
     # Get the parameters in a dictionary so that they can be pretty-printed
@@ -151,14 +317,16 @@ def build_with_antlr4(src, *,
     picire.cli.log_args('Building tree with ANTLRv4', args)
 
     from .antlr4 import create_hdd_tree
-    return create_hdd_tree(src,
-                           input_format=input_format, start=start,
-                           antlr=antlr, lang=lang,
-                           hidden_tokens=build_hidden_tokens,
-                           work_dir=work_dir)
+    hdd_tree = create_hdd_tree(src,
+                               input_format=input_format, start=start,
+                               antlr=antlr, lang=lang,
+                               hidden_tokens=build_hidden_tokens,
+                               work_dir=work_dir, build_cache=build_cache,
+                               island_jobs=island_jobs, keep_parsers=keep_parsers)
+    return hdd_tree_store.compact_tree(hdd_tree) if compact_tree else hdd_tree
 
 
-def build_with_srcml(src, *, language):
+def build_with_srcml(src, *, language, compact_tree=False):
     """
     Execute srcML-based tree building part of picireny as if invoked from
     command line, however, control its behaviour not via command line arguments
@@ -166,6 +334,8 @@ def build_with_srcml(src, *, language):
 
     :param src: Contents of the test case to reduce.
     :param language: Language of the input source (C, C++, C#, or Java).
+    :param compact_tree: Boolean to enable storing the built tree in compact
+        arrays.
     :return: The built HDD tree.
     """
     # Get the parameters in a dictionary so that they can be pretty-printed
@@ -174,14 +344,16 @@ def build_with_srcml(src, *, language):
     picire.cli.log_args('Building tree with srcML', args)
 
     from .srcml import create_hdd_tree
-    return create_hdd_tree(src, language=language)
+    hdd_tree = create_hdd_tree(src, language=language)
+    return hdd_tree_store.compact_tree(hdd_tree) if compact_tree else hdd_tree
 
 
 def reduce(hdd_tree, *,
            hddmin, reduce_class, reduce_config, tester_class, tester_config,
-           cache_class=None, unparse_with_whitespace=True,
+           cache_class=None, cache_config=None, unparse_with_whitespace=True,
            hdd_phase_configs=({},), hdd_star=True,
-           flatten_recursion=False, squeeze_tree=True, skip_unremovable=True, skip_whitespace=False):
+           flatten_recursion=False, squeeze_tree=True, skip_unremovable=True, skip_whitespace=False,
+           checkpoint=None, resume=None):
     """
     Execute tree reduction part of picireny as if invoked from command line,
     however, control its behaviour not via command line arguments but function
@@ -196,7 +368,10 @@ def reduce(hdd_tree, *,
         interestingness of a test case.
     :param tester_config: Dictionary containing information to initialize the
         tester_class.
-    :param cache_class: Reference to the cache class to use.
+    :param cache_class: Reference to the cache class to use. A single cache
+        instance is used for all phases.
+    :param cache_config: Dictionary containing information to initialize the
+        cache_class.
     :param unparse_with_whitespace: Unparse by adding whitespace between
         nonadjacent nodes.
     :param hdd_phase_configs: Sequence of dictionaries containing information to
@@ -209,6 +384,12 @@ def reduce(hdd_tree, *,
         ddmin.
     :param skip_whitespace: Boolean to enable hiding whitespace-only tokens from
         ddmin.
+    :param checkpoint: Function called with the tree and the state of the
+        reduction session during the reduction (e.g., a Checkpointer), or None.
+    :param resume: State of an interrupted reduction session (as given to
+        `checkpoint`) to continue from, or None. If given, hdd_tree must be the
+        tree saved with the state (the tree transformations are not performed
+        again).
     :return: The reduced HDD tree.
     """
     # Get the parameters in a dictionary so that they can be pretty-printed
@@ -218,39 +399,285 @@ def reduce(hdd_tree, *,
 
     log_tree('Initial tree', hdd_tree)
 
-    # Perform tree transformations.
-    if flatten_recursion:
-        hdd_tree = transform.flatten_recursion(hdd_tree)
-        log_tree('Tree after recursion flattening', hdd_tree)
+    # Perform tree transformations (unless resuming a session, when the tree
+    # has been transformed already).
+    if resume:
+        logger.info('Resuming reduction from phase #%d', resume['phase'])
+    else:
+        if flatten_recursion:
+            hdd_tree = transform.flatten_recursion(hdd_tree)
+            log_tree('Tree after recursion flattening', hdd_tree)
+
+        if squeeze_tree:
+            hdd_tree = transform.squeeze_tree(hdd_tree)
+            log_tree('Tree after squeezing', hdd_tree)
 
-    if squeeze_tree:
-        hdd_tree = transform.squeeze_tree(hdd_tree)
-        log_tree('Tree after squeezing', hdd_tree)
+        if skip_unremovable:
+            hdd_tree = transform.skip_unremovable(hdd_tree, unparse_with_whitespace=unparse_with_whitespace)
+            log_tree('Tree after skipping unremovable nodes', hdd_tree)
 
-    if skip_unremovable:
-        hdd_tree = transform.skip_unremovable(hdd_tree, unparse_with_whitespace=unparse_with_whitespace)
-        log_tree('Tree after skipping unremovable nodes', hdd_tree)
+        if skip_whitespace:
+            hdd_tree = transform.skip_whitespace(hdd_tree)
+            log_tree('Tree after skipping whitespace tokens', hdd_tree)
 
-    if skip_whitespace:
-        hdd_tree = transform.skip_whitespace(hdd_tree)
-        log_tree('Tree after skipping whitespace tokens', hdd_tree)
+    def phase_checkpoint(phase_cnt):
+        if not checkpoint:
+            return None
+        return lambda hdd_tree, state: checkpoint(hdd_tree, {'phase': phase_cnt, 'hddmin': state})
 
     # Perform reduction.
+    cache = cache_class(**(cache_config or {})) if cache_class else None
+    phase_cnt_start, hddmin_resume = (resume['phase'], resume['hddmin']) if resume else (0, None)
     for phase_cnt, phase_config in enumerate(hdd_phase_configs):
+        if phase_cnt < phase_cnt_start:
+            continue
+
         logger.info('Phase #%d', phase_cnt)
         hdd_tree = hddmin(hdd_tree,
                           reduce_class=reduce_class, reduce_config=reduce_config,
                           tester_class=tester_class, tester_config=tester_config,
                           id_prefix=(f'p{phase_cnt}',),
-                          cache=cache_class() if cache_class else None,
+                          cache=cache,
                           unparse_with_whitespace=unparse_with_whitespace,
                           hdd_star=hdd_star,
+                          checkpoint=phase_checkpoint(phase_cnt),
+                          resume=hddmin_resume if phase_cnt == phase_cnt_start else None,
                           **phase_config)
         log_tree(f'Tree after reduction phase #{phase_cnt}', hdd_tree)
+        if checkpoint:
+            checkpoint(hdd_tree, {'phase': phase_cnt + 1, 'hddmin': None})
 
     return hdd_tree
 
 
+def build_input(args, *, work_dir, keep_parsers=False):
+    """
+    Build (or load from a checkpoint) the tree of the input of a processed
+    command line.
+
+    :param args: Processed command line arguments of the input.
+    :param work_dir: Path to the working directory of the grammars.
+    :param keep_parsers: Keep the parsers running for further inputs (see
+        close_parsers).
+    :return: Pair of the HDD tree and of the state of the reduction session to
+        resume (or None).
+    :raises ValueError: If the checkpoint cannot be resumed.
+    """
+    if args.resume and exists(args.checkpoint_file):
+        # Resuming a session needs neither building nor transforming the tree.
+        return load_checkpoint(args.checkpoint_file, key=args.session_id)
+    if args.builder == 'antlr4':
+        return build_with_antlr4(args.src,
+                                 input_format=args.input_format, start=args.start,
+                                 antlr=args.antlr, lang=args.parser,
+                                 build_hidden_tokens=args.build_hidden_tokens,
+                                 work_dir=work_dir, build_cache=args.build_cache, island_jobs=args.island_jobs,
+                                 keep_parsers=keep_parsers, compact_tree=args.compact_tree), None
+    if args.builder == 'srcml':
+        return build_with_srcml(args.src, language=args.srcml_language, compact_tree=args.compact_tree), None
+    assert False, f'Unknown builder: {args.builder}'
+
+
+def close_parsers(args):
+    """
+    Terminate the parsers kept running for the inputs of a processed batch or
+    server command line.
+
+    :param args: Processed command line arguments of the batch or server.
+    """
+    if args.builder == 'antlr4':
+        from .antlr4 import close_parsers as close_antlr4_parsers
+        close_antlr4_parsers(args.input_format)
+
+
+def reduce_input(args, hdd_tree, resume):
+    """
+    Reduce the tree of the input of a processed command line and save the
+    result to the output directory.
+
+    :param args: Processed command line arguments of the input.
+    :param hdd_tree: HDD tree to reduce.
+    :param resume: State of the reduction session to resume (or None).
+    """
+    unparse_with_whitespace = args.builder == 'antlr4' and not args.build_hidden_tokens
+    checkpoint = None
+    if args.checkpoint_interval is not None:
+        checkpoint = Checkpointer(args.checkpoint_file, key=args.session_id, interval=args.checkpoint_interval)
+
+    hdd_tree = reduce(hdd_tree,
+                      hddmin=args.hddmin,
+                      reduce_class=args.reduce_class, reduce_config=args.reduce_config,
+                      tester_class=args.tester_class, tester_config=args.tester_config,
+                      cache_class=args.cache, cache_config=args.cache_config, unparse_with_whitespace=unparse_with_whitespace,
+                      hdd_phase_configs=args.hdd_phase_configs, hdd_star=args.hdd_star,
+                      flatten_recursion=args.flatten_recursion,
+                      squeeze_tree=args.squeeze_tree,
+                      skip_unremovable=args.skip_unremovable,
+                      skip_whitespace=args.skip_whitespace,
+                      checkpoint=checkpoint,
+                      resume=resume)
+    if args.cleanup and exists(args.checkpoint_file):
+        remove(args.checkpoint_file)
+    out_src = hdd_tree.unparse(with_whitespace=unparse_with_whitespace)
+
+    picire.cli.postprocess(args, out_src)
+
+
+def reduce_batch(args):
+    """
+    Reduce all inputs of a processed batch command line.
+
+    The grammars are prepared into the input format shared by the inputs when
+    the first tree is built, and are reused (together with the running Java
+    parser processes) for the rest of the inputs. The trees are built one at a
+    time (the parsers are not thread-safe), but several inputs may be reduced
+    in parallel.
+
+    :param args: Processed command line arguments of the batch.
+    :return: List of the paths of the inputs whose reduction failed.
+    """
+    # The name of the directory cannot clash with the names of the inputs
+    # (hidden files are not considered inputs).
+    work_dir = join(args.out, '.grammar')
+    build_lock = Lock()
+
+    def reduce_batch_input(input_args):
+        return None if reduce_job(input_args, work_dir=work_dir, build_lock=build_lock) else input_args.input
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.batch_jobs) as executor:
+            failed = [path for path in executor.map(reduce_batch_input, args.batch_inputs) if path]
+    finally:
+        close_parsers(args)
+
+    if args.cleanup and exists(work_dir):
+        rmtree(work_dir)
+    return failed
+
+
+def reduce_job(input_args, *, work_dir, build_lock):
+    """
+    Build and reduce the tree of an input of a batch or of a server.
+
+    :param input_args: Processed command line arguments of the input.
+    :param work_dir: Path to the working directory of the grammars shared by
+        the inputs.
+    :param build_lock: Lock to serialize the building of the trees.
+    :return: Boolean denoting whether the reduction succeeded.
+    """
+    # The failures expected of a single input are: the input is not
+    # interesting (the sanity check of the reducer fails), the checkpoint
+    # cannot be resumed, or the input cannot be read, parsed, or tested. Other
+    # errors are not specific to the input and are propagated.
+    try:
+        with build_lock:
+            hdd_tree, resume = build_input(input_args, work_dir=work_dir, keep_parsers=True)
+        reduce_input(input_args, hdd_tree, resume)
+        return True
+    except (AssertionError, OSError, SubprocessError, ValueError) as e:
+        logger.error('Reduction of %s failed.', input_args.input, exc_info=e)
+        return False
+
+
+def write_job_status(job_dir, status):
+    # The status file is replaced in one step, so that clients never see it
+    # partially written.
+    tmp_file = join(job_dir, '.status')
+    with open(tmp_file, 'w') as f:
+        f.write(f'{status}\n')
+    replace(tmp_file, join(job_dir, 'status'))
+
+
+def serve(args):
+    """
+    Reduce the test cases submitted to the spool directory (the input of a
+    processed server command line), until interrupted or until the spool
+    directory has been idle for the given timeout.
+
+    A test case is submitted by moving it into the spool directory (files
+    whose names start with a dot are ignored, thus a test case can be written
+    under such a temporary name first and then be renamed). The server moves
+    the test case into the subdirectory of the job in the output directory,
+    and keeps the state of the job (running, done or failed) up to date in the
+    status file of the subdirectory. The result of the job is saved into the
+    same subdirectory.
+
+    The grammars and the parsers are kept prepared between the jobs, as in
+    batch mode.
+
+    :param args: Processed command line arguments of the server.
+    """
+    work_dir = join(args.out, '.grammar')
+    build_lock = Lock()
+    jobs = max(1, args.jobs // args.batch_jobs)
+
+    def claim_job(fn):
+        name = fn
+        cnt = 0
+        while exists(join(args.out, name)):
+            cnt += 1
+            name = f'{fn}.{cnt}'
+        job_dir = join(args.out, name)
+        makedirs(join(job_dir, 'input'))
+        path = join(job_dir, 'input', fn)
+        move(join(args.input, fn), path)
+        return job_dir, path
+
+    def run_job(job_dir, path):
+        write_job_status(job_dir, 'running')
+        # The job fails unless it is done, even if an unexpected error is
+        # raised (which is logged by report_job).
+        status = 'failed'
+        try:
+            input_args = process_job_args(args, path, job_dir, jobs=jobs)
+            status = 'done' if reduce_job(input_args, work_dir=work_dir, build_lock=build_lock) else 'failed'
+        except ValueError as e:
+            logger.error('Job %s is invalid: %s', job_dir, e)
+        finally:
+            write_job_status(job_dir, status)
+
+    def report_job(job_dir, future):
+        if future.exception() is not None:
+            logger.error('Job %s failed unexpectedly.', job_dir, exc_info=future.exception())
+
+    logger.info('Serving reduction jobs from %s', args.input)
+    running = set()
+    idle_since = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=args.batch_jobs) as executor:
+            try:
+                while True:
+                    running = {future for future in running if not future.done()}
+                    for fn in sorted(listdir(args.input)):
+                        if len(running) >= args.batch_jobs:
+                            break
+                        if fn.startswith('.') or not isfile(join(args.input, fn)):
+                            continue
+                        try:
+                            job_dir, path = claim_job(fn)
+                        except OSError as e:
+                            # The client may have withdrawn the test case.
+                            logger.warning('Failed to claim %s: %s', fn, e)
+                            continue
+                        logger.info('Job %s is submitted.', job_dir)
+                        future = executor.submit(run_job, job_dir, path)
+                        future.add_done_callback(partial(report_job, job_dir))
+                        running.add(future)
+
+                    if running:
+                        idle_since = time.monotonic()
+                    elif args.serve_timeout is not None and time.monotonic() - idle_since >= args.serve_timeout:
+                        break
+                    time.sleep(args.serve_interval)
+            except KeyboardInterrupt:
+                logger.info('Server is stopping, waiting for the running jobs to finish.')
+    finally:
+        close_parsers(args)
+
+    if args.cleanup and exists(work_dir):
+        rmtree(work_dir)
+
+
 def execute():
     """
     The main entry point of picireny.
@@ -278,6 +705,35 @@ def execute():
                             help='don\'t hide unremovable nodes from the ddmin algorithm')
     arg_parser.add_argument('--skip-whitespace', dest='skip_whitespace', default=False, action='store_true',
                             help='hide whitespace tokens from the ddmin algorithm')
+    arg_parser.add_argument('--compact-tree', default=False, action='store_true',
+                            help='store the tree in compact arrays (uses less memory but tree access is slower)')
+    arg_parser.add_argument('--cache-limit', metavar='N', type=int,
+                            help='maximum number of test outcomes to keep in the content cache, least recently used '
+                                 'outcomes are evicted first (has effect with the content cache only; default: unlimited)')
+    arg_parser.add_argument('--outcome-store', metavar='FILE',
+                            help='SQLite database to store test outcomes in and to reuse them from across runs '
+                                 '(implies content-based caching; default: don\'t store)')
+    arg_parser.add_argument('--checkpoint-interval', metavar='SEC', type=float,
+                            help='save the state of the reduction to the output directory at most every SEC seconds, so that '
+                                 'an interrupted reduction can be resumed (default: don\'t save)')
+    arg_parser.add_argument('--resume', default=False, action='store_true',
+                            help='resume the reduction from the state saved to the output directory (if any)')
+    arg_parser.add_argument('--batch', default=False, action='store_true',
+                            help='reduce all (non-hidden) files of the input directory with the same tester and input format, preparing '
+                                 'the grammars only once (the results are saved to per-input subdirectories of the output '
+                                 'directory)')
+    arg_parser.add_argument('--serve', default=False, action='store_true',
+                            help='keep running and reduce the test cases submitted to the input (spool) directory with the '
+                                 'same tester and input format (the results are saved to per-job subdirectories of the '
+                                 'output directory)')
+    arg_parser.add_argument('--batch-jobs', metavar='N', type=int, default=1,
+                            help='maximum number of inputs to reduce in parallel in batch or server mode (the parallel '
+                                 'reductions share the budget of --jobs; default: %(default)s)')
+    arg_parser.add_argument('--serve-interval', metavar='SEC', type=float, default=1,
+                            help='time between polling the spool directory in server mode (default: %(default)s)')
+    arg_parser.add_argument('--serve-timeout', metavar='SEC', type=float,
+                            help='stop the server if no jobs have been running for the given time (default: run until '
+                                 'interrupted)')
     inators.arg.add_sys_recursion_limit_argument(arg_parser)
     inators.arg.add_version_argument(arg_parser, version=__version__)
 
@@ -300,6 +756,12 @@ def execute():
     antlr4_grp.add_argument('--parser', '--antlr4:parser', metavar='LANG', default='python', choices=['python', 'java'],
                             help='language of the generated parsers (%(choices)s; default: %(default)s) '
                                  '(using Java might gain performance, but needs JDK)')
+    antlr4_grp.add_argument('--build-cache', '--antlr4:build-cache', metavar='DIR',
+                            help='directory to cache the built grammars in and to reuse them from across runs '
+                                 '(default: don\'t cache)')
+    antlr4_grp.add_argument('--island-jobs', '--antlr4:island-jobs', metavar='N', type=int, default=1,
+                            help='maximum number of island fragments to parse in parallel (only effective with the '
+                                 'Java parser; default: %(default)s)')
 
     # srcML-specific settings.
     srcml_grp = arg_parser.add_argument_group('srcML-specific arguments')
@@ -313,32 +775,22 @@ def execute():
     except ValueError as e:
         arg_parser.error(e)
 
-    if args.builder == 'antlr4':
-        work_dir = join(args.out, 'grammar')
-        hdd_tree = build_with_antlr4(args.src,
-                                     input_format=args.input_format, start=args.start,
-                                     antlr=args.antlr, lang=args.parser,
-                                     build_hidden_tokens=args.build_hidden_tokens,
-                                     work_dir=work_dir)
-        unparse_with_whitespace = not args.build_hidden_tokens
-        if args.cleanup:
-            rmtree(work_dir)
-    elif args.builder == 'srcml':
-        hdd_tree = build_with_srcml(args.src, language=args.srcml_language)
-        unparse_with_whitespace = False
-    else:
-        assert False, f'Unknown builder: {args.builder}'
+    if args.batch:
+        failed = reduce_batch(args)
+        if failed:
+            arg_parser.exit(1, f'Reduction failed for {len(failed)} input(s): {", ".join(failed)}\n')
+        return
 
-    hdd_tree = reduce(hdd_tree,
-                      hddmin=args.hddmin,
-                      reduce_class=args.reduce_class, reduce_config=args.reduce_config,
-                      tester_class=args.tester_class, tester_config=args.tester_config,
-                      cache_class=args.cache, unparse_with_whitespace=unparse_with_whitespace,
-                      hdd_phase_configs=args.hdd_phase_configs, hdd_star=args.hdd_star,
-                      flatten_recursion=args.flatten_recursion,
-                      squeeze_tree=args.squeeze_tree,
-                      skip_unremovable=args.skip_unremovable,
-                      skip_whitespace=args.skip_whitespace)
-    out_src = hdd_tree.unparse(with_whitespace=unparse_with_whitespace)
+    if args.serve:
+        serve(args)
+        return
 
-    picire.cli.postprocess(args, out_src)
+    work_dir = join(args.out, 'grammar')
+    try:
+        hdd_tree, resume = build_input(args, work_dir=work_dir)
+    except ValueError as e:
+        arg_parser.error(e)
+    if args.cleanup and exists(work_dir):
+        rmtree(work_dir)
+
+    reduce_input(args, hdd_tree, resume)
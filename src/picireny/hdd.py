@@ -19,7 +19,8 @@ logger = logging.getLogger(__name__)
 def hddmin(hdd_tree, *,
            reduce_class, reduce_config, tester_class, tester_config,
            id_prefix=(), cache=None, unparse_with_whitespace=True,
-           config_filter=None, transformations=(prune,), hdd_star=True):
+           config_filter=None, transformations=(prune,), hdd_star=True,
+           checkpoint=None, resume=None):
     """
     Run the hierarchical delta debugging reduce algorithm.
 
@@ -42,51 +43,77 @@ def hddmin(hdd_tree, *,
     :param transformations: Iterable of transformations that reduce a
         configuration of nodes.
     :param hdd_star: Boolean to enable the HDD star algorithm.
+    :param checkpoint: Function called with the tree and the state of the
+        reduction after every level, or None. The state can be passed as
+        `resume` to continue the reduction from that point.
+    :param resume: State of an interrupted reduction (as given to
+        `checkpoint`) to continue from, or None to start from the beginning.
     :return: The reduced test case (1-tree-minimal if hdd_star is True and
         config_filter is None).
     """
 
-    def collect_level_nodes(level):
-        def _collect_level_nodes(node, current_level):
-            if node.state != node.KEEP:
-                return
-            if current_level == level:
-                level_nodes.append(node)
-            elif hasattr(node, 'children'):
-                for child in node.children:
-                    _collect_level_nodes(child, current_level + 1)
-        level_nodes = []  # Using `list` (not `set`) for the sake of stability.
-        _collect_level_nodes(hdd_tree, 0)
-        return level_nodes
-
-    for iter_cnt in itertools.count():
+    def collect_level_nodes(upper_level_nodes):
+        # The nodes of a level are the kept children of the nodes of the level
+        # above it. As transformations only change the nodes of the level they
+        # are applied to (and their subtrees), this is equivalent to walking
+        # the tree from the root but costs time proportional to the level size
+        # only.
+        if upper_level_nodes is None:
+            return [hdd_tree] if hdd_tree.state == hdd_tree.KEEP else []
+        return [child
+                for node in upper_level_nodes if hasattr(node, 'children')
+                for child in node.children if child.state == child.KEEP]
+
+    if resume:
+        iter_cnt_start, level_start, changed = resume['iteration'], resume['level'], resume['changed']
+    else:
+        iter_cnt_start, level_start, changed = 0, 0, False
+
+    for iter_cnt in itertools.count(iter_cnt_start):
         logger.info('Iteration #%d', iter_cnt)
 
-        changed = False
+        # The height of the tree is only computed once per iteration (for the
+        # sake of logging), thus it is an upper bound of the actual height.
+        if logger.isEnabledFor(logging.INFO):
+            tree_height = height(hdd_tree)
+
+        upper_level_nodes = None
         for level in itertools.count():
-            level_nodes = collect_level_nodes(level)
+            level_nodes = collect_level_nodes(upper_level_nodes)
             if not level_nodes:
                 break
 
-            if config_filter:
-                level_nodes = list(filter(config_filter, level_nodes))
-                if not level_nodes:
-                    continue
+            config_nodes = list(filter(config_filter, level_nodes)) if config_filter else level_nodes
+            # Levels before the resumed one have been checked already.
+            if config_nodes and level >= level_start:
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info('Checking level %d / %d ...', level, tree_height)
 
-            if logger.isEnabledFor(logging.INFO):
-                logger.info('Checking level %d / %d ...', level, height(hdd_tree))
+                level_changed = False
+                for trans_cnt, transformation in enumerate(transformations):
+                    hdd_tree, transformed = transformation(hdd_tree, config_nodes,
+                                                           reduce_class=reduce_class, reduce_config=reduce_config,
+                                                           tester_class=tester_class, tester_config=tester_config,
+                                                           id_prefix=id_prefix + (f'i{iter_cnt}', f'l{level}', f't{trans_cnt}'),
+                                                           cache=cache,
+                                                           unparse_with_whitespace=unparse_with_whitespace)
 
-            for trans_cnt, transformation in enumerate(transformations):
-                hdd_tree, transformed = transformation(hdd_tree, level_nodes,
-                                                       reduce_class=reduce_class, reduce_config=reduce_config,
-                                                       tester_class=tester_class, tester_config=tester_config,
-                                                       id_prefix=id_prefix + (f'i{iter_cnt}', f'l{level}', f't{trans_cnt}'),
-                                                       cache=cache,
-                                                       unparse_with_whitespace=unparse_with_whitespace)
+                    level_changed = level_changed or transformed
 
-                changed = changed or transformed
+                # Re-collect the nodes of the level if transformations have
+                # removed or replaced (hoisted) some of them.
+                if level_changed:
+                    changed = True
+                    level_nodes = collect_level_nodes(upper_level_nodes)
+
+            upper_level_nodes = level_nodes
+
+            if checkpoint and level >= level_start:
+                checkpoint(hdd_tree, {'iteration': iter_cnt, 'level': level + 1, 'changed': changed})
 
         if not hdd_star or not changed:
             break
 
+        level_start, changed = 0, False
+
     return hdd_tree
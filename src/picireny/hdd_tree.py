@@ -6,16 +6,24 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
-from itertools import count
+from functools import lru_cache
+from itertools import chain, count, islice
 from os import linesep
 from textwrap import indent
 
+from .traversal import fold, walk
+
 
 class Position:
     """
     Class defining a position in the input file. Used to recognise line breaks
     between tokens.
+
+    Positions are treated as immutable, so that they can be shared between
+    nodes.
     """
+    __slots__ = ('line', 'column')
+
     def __init__(self, line=1, column=0):
         """
         Initialize position object.
@@ -34,25 +42,235 @@ class Position:
         """
         Calculate the end position of a text starting at the current position.
         """
+        if not text:
+            return self
         line_breaks = text.count('\n')
         return Position(self.line + line_breaks,
                         self.column + len(text) if not line_breaks else len(text) - text.rfind('\n') - 1)
 
     def shift(self, start):
         """
-        Shift the position by prepending a starting position.
+        Calculate the position shifted by prepending a starting position.
         """
         if self.line > 1:
-            self.line += start.line - 1
-        else:
-            self.line = start.line
-            self.column += start.column
+            return Position(self.line + start.line - 1, self.column)
+        return Position(start.line, self.column + start.column)
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self.line!r}, {self.column!r})'
 
 
+# Modulus and base of the polynomial hash used for fingerprinting texts. The
+# hash of a text is the polynomial of its UTF-8 bytes evaluated at a large odd
+# base modulo a 64-bit prime, which makes the hash of a concatenation
+# computable from the hashes (and lengths) of its parts. (With a small base,
+# like 256, small edits of the same text could cancel out each other, e.g., as
+# 256 ** 8 is 59 modulo the prime, 'b1234567A' and 'a1234567|' would collide.)
+_FINGERPRINT_MOD = (1 << 64) - 59
+_FINGERPRINT_BASE = 0x5c3a_9e6f_d2b1_784b
+
+
+# The fingerprints of the most recently seen token texts are cached, as the
+# same texts (keywords, punctuation) occur in many tokens.
+@lru_cache(maxsize=4096)
+def _text_fingerprint(text):
+    """
+    Compute the fingerprint of a text.
+
+    :param text: The text (or None, which is fingerprinted as the empty text).
+    :return: Pair of the hash and the length (in bytes) of the text.
+    """
+    data = (text or '').encode('utf-8')
+    h = 0
+    for b in data:
+        h = (h * _FINGERPRINT_BASE + b) % _FINGERPRINT_MOD
+    return h, len(data)
+
+
+def text_fingerprint(text):
+    """
+    Compute the fingerprint of a text, as HDDTree.fingerprint would compute it
+    for a tree that unparses to the text.
+
+    :param text: The text (or None, which is fingerprinted as the empty text).
+    :return: The fingerprint of the text as bytes.
+    """
+    return _fingerprint_bytes(_text_fingerprint(text))
+
+
+def _fingerprint_bytes(fingerprint):
+    h, n = fingerprint
+    return h.to_bytes(8, 'big') + n.to_bytes(8, 'big')
+
+
+def _concat_fingerprints(fingerprints):
+    """
+    Compute the fingerprint of the concatenation of texts.
+
+    :param fingerprints: Iterable of the fingerprints of the texts.
+    :return: The fingerprint of the concatenated text.
+    """
+    h, n = 0, 0
+    for part_h, part_n in fingerprints:
+        h = (h * pow(_FINGERPRINT_BASE, part_n, _FINGERPRINT_MOD) + part_h) % _FINGERPRINT_MOD
+        n += part_n
+    return h, n
+
+
+def _is_empty_fingerprint(fingerprint):
+    return not fingerprint[1]
+
+
+# Texts shorter than this are rendered (and memoized) as strings, longer texts
+# as ropes. The memoized text of a rule thus never copies the long texts of its
+# subtrees, which keeps the memory used by the memo linear in the size of the
+# tree (instead of the size of the text times the depth of the tree).
+_ROPE_THRESHOLD = 256
+
+
+def _same_text(text):
+    return text
+
+
+class _Rope:
+    """
+    Concatenation of texts (strings or ropes), which are shared and not
+    copied.
+    """
+    __slots__ = ('parts', 'length', 'flat')
+
+    def __init__(self, parts, length):
+        self.parts = parts
+        self.length = length
+        # Whether all parts are strings.
+        self.flat = _Rope not in set(map(type, parts))
+
+    def __len__(self):
+        return self.length
+
+
+def _concat_texts(parts):
+    """
+    Concatenate texts. Short results are strings, long results are ropes.
+
+    :param parts: List of the texts (strings or ropes) to concatenate.
+    :return: The concatenated text as a string or rope.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    length = sum(map(len, parts))
+    if length < _ROPE_THRESHOLD:
+        # Ropes are never shorter than the threshold, thus all parts are
+        # strings here.
+        return ''.join(parts)
+    return _Rope(tuple(parts), length)
+
+
+def _text_chunks(text):
+    """
+    Iterate over the strings of a text.
+
+    :param text: The text as a string or rope.
+    :return: Generator of the strings of the text.
+    """
+    stack = [text]
+    while stack:
+        text = stack.pop()
+        if isinstance(text, str):
+            yield text
+        elif text.flat:
+            yield from text.parts
+        else:
+            stack.extend(reversed(text.parts))
+
+
+def _join_text(text):
+    """
+    Convert a text to string.
+
+    :param text: The text as a string or rope.
+    :return: The text as a string.
+    """
+    if isinstance(text, str):
+        return text
+    chunks = []
+    stack = [text]
+    while stack:
+        text = stack.pop()
+        if isinstance(text, str):
+            chunks.append(text)
+        elif text.flat:
+            chunks.extend(text.parts)
+        else:
+            stack.extend(reversed(text.parts))
+    return ''.join(chunks)
+
+
+def _is_empty_text(text):
+    return not text
+
+
+def _separator(prev, node, with_whitespace):
+    """
+    Compute the whitespace to separate two adjacent siblings with.
+
+    :param prev: The previous sibling.
+    :param node: The next sibling.
+    :param with_whitespace: Add whitespace (space, new line) to separate
+        nonadjacent nodes.
+    :return: New line, space, or the empty string.
+    """
+    if with_whitespace:
+        if node.start.line > prev.end.line:
+            return linesep
+        if node.start.column > prev.end.column:
+            return ' '
+    return ''
+
+
+def _transform_preparer(transform, transformed):
+    """
+    Create a function that prepares the nodes of a tree for unparsing by
+    applying `transform` to those that may change.
+
+    :param transform: A function applied to each node before unparsing, or
+        None.
+    :param transformed: Iterable of the nodes that `transform` may change, or
+        None (see HDDTree.unparse).
+    :return: Function returning a pair of a node (transformed if needed) and a
+        boolean whether the subtree of the node is unaffected by `transform`
+        (i.e., whether it is clean and can be memoized).
+    """
+    def _prepare(node):
+        if dirty is not None and node.id not in dirty:
+            return node, True
+
+        if transform:
+            node = transform(node)
+            if dirty is not None and node.id not in dirty:
+                return node, True
+
+        return node, False
+
+    if not transform:
+        dirty = set()
+    elif transformed is None:
+        dirty = None
+    else:
+        # Collect the IDs of the nodes that may change and of all their
+        # ancestors, as their text cannot be taken from the memo.
+        dirty = set()
+        for node in transformed:
+            while node is not None and node.id not in dirty:
+                dirty.add(node.id)
+                node = node.parent
+
+    return _prepare
+
+
 class HDDTree:
+    __slots__ = ('name', 'replace', 'start', 'end', 'parent', 'state', 'id')
+
     # Node states for unparsing.
     REMOVED = 0
     KEEP = 1
@@ -77,47 +295,217 @@ class HDDTree:
         self.state = self.KEEP
         self.id = next(self.__id)
 
-    def unparse(self, *, with_whitespace=True, transform=None):
+    def unparse(self, *, with_whitespace=True, transform=None, transformed=None):
         """
         Build test case from a HDD tree.
 
+        The unparsed text of the subtrees that are not affected by `transform`
+        is memoized in the rule nodes, so that building test cases that differ
+        only in a few nodes does not need to re-render the whole tree. (See
+        `invalidate` on how to keep the memoized texts up-to-date.) Long texts
+        are memoized as ropes that share the memoized texts of the subtrees,
+        so that the memo does not store the text of a subtree again for every
+        ancestor.
+
         :param with_whitespace: Add whitespace (space, new line) to separate
             nonadjacent nodes.
         :param transform: A function applied to each node before unparsing, or
             None.
+        :param transformed: Iterable of the nodes that `transform` may change,
+            or None. If given, `transform` is applied to these nodes and their
+            ancestors only, and the memoized text of all other subtrees is
+            reused. If None, `transform` is applied to every node and nothing
+            is memoized.
         :return: The unparsed test case.
         """
-        def _unparse(node):
-            if transform:
-                node = transform(node)
+        return _join_text(self._unparse_text(with_whitespace=with_whitespace, transform=transform, transformed=transformed))
+
+    def _unparse_text(self, *, with_whitespace, transform, transformed):
+        """
+        Build test case from a HDD tree as a string or rope (see `unparse`).
+        """
+        return self._render(with_whitespace=with_whitespace, transform=transform, transformed=transformed,
+                            text=_same_text, concat=_concat_texts, is_empty=_is_empty_text, memo='_unparsed')
+
+    def unparse_chunks(self, *, with_whitespace=True, transform=None, transformed=None):
+        """
+        Build test case from a HDD tree chunk by chunk. The concatenation of the
+        chunks is the same as the result of `unparse`, but the test case is
+        never held in memory as a whole: only the (memoized) texts of the
+        subtrees that are not affected by `transform` are yielded as they are,
+        the rest is yielded piece by piece.
+
+        :param with_whitespace: Add whitespace (space, new line) to separate
+            nonadjacent nodes.
+        :param transform: A function applied to each node before unparsing, or
+            None.
+        :param transformed: Iterable of the nodes that `transform` may change,
+            or None (see `unparse`).
+        :return: Generator of the chunks of the unparsed test case.
+        """
+        # The items of the traversal are (node, clean, separator) triples,
+        # where separator is the whitespace to add before the node if it is
+        # not empty (None for first children).
+        def _children(item):
+            node, clean, _ = item
+            if clean or node.state != node.KEEP or isinstance(node, HDDToken):
+                return None
+            children = node.children
+            return [prepare(child) + (_separator(previous, child, with_whitespace) if previous is not None else None, )
+                    for previous, child in zip(chain([None], children), children)]
+
+        prepare = _transform_preparer(transform, transformed)
+        # Separators are only added before non-empty chunks. The separators
+        # waiting for a chunk are kept together with the depth of their
+        # parent, so that the separators inside of an empty sibling subtree
+        # can be dropped.
+        pending = []
+        depth = 0
+        for (node, clean, separator), entering in walk(prepare(self) + (None, ), _children):
+            if not entering:
+                depth -= 1
+                continue
+
+            if separator is not None:
+                while pending and pending[-1][0] >= depth:
+                    pending.pop()
+                if separator:
+                    pending.append((depth, separator))
+            depth += 1
 
             if node.state != node.KEEP:
-                return node.replace
+                text = node.replace
+            elif isinstance(node, HDDToken):
+                text = node.text
+            elif clean:
+                text = node._unparse_text(with_whitespace=with_whitespace, transform=None, transformed=None)
+            else:
+                continue
+
+            if text:
+                for _, pending_separator in pending:
+                    yield pending_separator
+                pending.clear()
+                yield from _text_chunks(text)
+
+    def fingerprint(self, *, with_whitespace=True, transform=None, transformed=None):
+        """
+        Compute the fingerprint of the test case that `unparse` would build
+        from a HDD tree, without building the test case. Equal test cases have
+        equal fingerprints (different test cases have different fingerprints
+        with high probability).
 
-            # Keep the text of the token.
-            if isinstance(node, HDDToken):
-                return node.text
+        The fingerprints of the subtrees that are not affected by `transform`
+        are memoized in the rule nodes (and kept up-to-date together with the
+        memoized unparsed texts, see `invalidate`), so that fingerprinting
+        test cases that differ only in a few nodes does not need to walk the
+        whole tree.
 
-            if not node.children:
-                return ''
+        :param with_whitespace: Add whitespace (space, new line) to separate
+            nonadjacent nodes.
+        :param transform: A function applied to each node before
+            fingerprinting, or None.
+        :param transformed: Iterable of the nodes that `transform` may change,
+            or None (see `unparse`).
+        :return: The fingerprint of the test case as bytes.
+        """
+        return _fingerprint_bytes(self._render(with_whitespace=with_whitespace, transform=transform, transformed=transformed,
+                                               text=_text_fingerprint, concat=_concat_fingerprints,
+                                               is_empty=_is_empty_fingerprint, memo='_fingerprint'))
 
-            # Concat the text of children.
-            child_strs = [_unparse(child) for child in node.children]
-            node_str = child_strs[0]
-            for i in range(1, len(node.children)):
-                # Do not add extra spaces if the next chunk is empty.
-                if not child_strs[i]:
-                    continue
-                if with_whitespace:
-                    if node.children[i].start.line > node.children[i - 1].end.line:
-                        node_str += linesep
-                    elif node.children[i].start.column > node.children[i - 1].end.column:
-                        node_str += ' '
-                node_str += child_strs[i]
+    def _render(self, *, with_whitespace, transform, transformed, text, concat, is_empty, memo):
+        """
+        Compute a value from the test case of a HDD tree bottom-up (e.g., the
+        unparsed text, or its fingerprint), memoizing the values of the
+        subtrees that are not affected by `transform` in the rule nodes.
 
-            return node_str
+        :param with_whitespace: Add whitespace (space, new line) to separate
+            nonadjacent nodes.
+        :param transform: A function applied to each node before rendering, or
+            None.
+        :param transformed: Iterable of the nodes that `transform` may change,
+            or None (see `unparse`).
+        :param text: Function computing the value of a string.
+        :param concat: Function computing the value of a concatenation from
+            the list of the values of its parts.
+        :param is_empty: Function deciding whether a value belongs to the empty
+            string.
+        :param memo: Name of the attribute of rule nodes to memoize the values
+            in (the attribute holds a pair of with_whitespace and the value).
+        :return: The value of the test case.
+        """
+        def _memoized(node):
+            memoized = getattr(node, memo)
+            return memoized[1] if memoized is not None and memoized[0] == with_whitespace else None
+
+        # The items of the traversal are (node, clean) pairs, where clean
+        # nodes are not affected by transform (and neither are their
+        # descendants).
+        def _children(item):
+            node, clean = item
+            if node.state != node.KEEP or isinstance(node, HDDToken):
+                return None
+            if clean:
+                return [(child, True) for child in node.children] if _memoized(node) is None else None
+            return [prepare(child) for child in node.children]
+
+        def _combine(item, child_values):
+            node, clean = item
+            if node.state != node.KEEP:
+                return text(node.replace)
 
-        return _unparse(self)
+            # Keep the text of the token.
+            if isinstance(node, HDDToken):
+                return text(node.text)
+
+            if clean:
+                value = _memoized(node)
+                if value is not None:
+                    return value
+
+            # Concat the values of children.
+            children = node.children
+            if children:
+                parts = [child_values[0]]
+                for previous, child, child_value in zip(children, islice(children, 1, None), islice(child_values, 1, None)):
+                    # Do not add extra spaces if the next chunk is empty.
+                    if is_empty(child_value):
+                        continue
+                    separator = _separator(previous, child, with_whitespace)
+                    if separator:
+                        parts.append(text(separator))
+                    parts.append(child_value)
+                value = concat(parts)
+            else:
+                value = text('')
+
+            if clean:
+                setattr(node, memo, (with_whitespace, value))
+            return value
+
+        prepare = _transform_preparer(transform, transformed)
+        return fold(prepare(self), _children, _combine)
+
+    def invalidate(self):
+        """
+        Drop the memoized unparsed text (and fingerprint) of the node and of all
+        its ancestors.
+        Must be called whenever the state of a node or the children of a rule
+        are changed directly (`replace_with`, `add_child`, and `remove_child`
+        take care of it themselves).
+        """
+        if isinstance(self, HDDRule):
+            self._unparsed = None
+            self._fingerprint = None
+        # If the text of a rule is memoized, then that of all its kept
+        # descendants is, too. So, the text of a kept rule can only depend on
+        # the changed node if the parent of the node has a memoized text. (The
+        # same holds for fingerprints.)
+        node = self.parent
+        while node is not None and (node._unparsed is not None or node._fingerprint is not None):
+            node._unparsed = None
+            node._fingerprint = None
+            node = node.parent
 
     def replace_with(self, other):
         """
@@ -127,9 +515,12 @@ class HDDTree:
         """
         self.parent.children[self.parent.children.index(self)] = other
         other.parent = self.parent
+        self.parent.invalidate()
 
 
 class HDDToken(HDDTree):
+    __slots__ = ('text', )
+
     def __init__(self, name, text, *, start=None, end=None, replace=None):
         super().__init__(name, start=start, end=end, replace=replace)
         self.text = text
@@ -153,13 +544,31 @@ class HDDToken(HDDTree):
 
 
 class HDDRule(HDDTree):
+    __slots__ = ('children', '_unparsed', '_fingerprint')
+
     def __init__(self, name, *, start=None, end=None, replace=None):
         super().__init__(name, start=start, end=end, replace=replace)
         self.children = []
+        self._unparsed = None
+        self._fingerprint = None
+
+    def __getstate__(self):
+        # The memoized values are not pickled, they are recomputed on demand.
+        return None, {slot: getattr(self, slot)
+                      for cls in type(self).__mro__ for slot in cls.__dict__.get('__slots__', ())
+                      if slot not in ('_unparsed', '_fingerprint')}
+
+    def __setstate__(self, state):
+        _, slots = state
+        for slot, value in slots.items():
+            setattr(self, slot, value)
+        self._unparsed = None
+        self._fingerprint = None
 
     def add_child(self, child):
         self.children.append(child)
         child.parent = self
+        self.invalidate()
 
     def add_children(self, children):
         for child in children:
@@ -167,6 +576,7 @@ class HDDRule(HDDTree):
 
     def remove_child(self, child):
         self.children.remove(child)
+        self.invalidate()
 
     def __repr__(self):
         parts = [
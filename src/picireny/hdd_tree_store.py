@@ -0,0 +1,443 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+from array import array
+from collections.abc import MutableSequence
+from weakref import WeakValueDictionary
+
+from .hdd_tree import HDDRule, Position
+from .traversal import walk
+
+
+class HDDTreeStore:  # pylint: disable=too-many-instance-attributes
+    """
+    Compact storage of HDD trees. Nodes are stored in parallel arrays (parent,
+    first child, next sibling, state, positions, and interned strings), and are
+    accessed through lightweight views that are compatible with HDDTree (and
+    with the subclass the node was created from), so that transformations and
+    reduction algorithms can work on stored trees unchanged.
+
+    The IDs of the views are their indices in the store. Positions returned by
+    views are fresh objects, i.e., changing them in-place has no effect, they
+    have to be assigned to the node. If a node that is not in the store is
+    added as a child to a stored rule, then the node (and its subtree) is
+    copied into the store.
+    """
+
+    def __init__(self):
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.state = array('b')
+        self.start_line = array('i')
+        self.start_column = array('i')
+        self.end_line = array('i')
+        self.end_column = array('i')
+        self.cls = array('B')
+        self.name = array('i')
+        self.replace = array('i')
+        self.text = array('i')
+
+        self._strings = []
+        self._string_ids = {}
+        self._classes = []
+        self._class_ids = {}
+        self._views = WeakValueDictionary()
+        self._foreign_parents = {}
+        self._unparsed = {}
+        self._fingerprints = {}
+
+    def __len__(self):
+        return len(self.parent)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_views']
+        state['_unparsed'] = {}
+        state['_fingerprints'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._views = WeakValueDictionary()
+
+    def intern(self, s):
+        """
+        Get the ID of a string in the string table of the store.
+
+        :param s: The string (or None).
+        :return: The ID of the string (-1 for None).
+        """
+        if s is None:
+            return -1
+        sid = self._string_ids.get(s)
+        if sid is None:
+            sid = len(self._strings)
+            self._strings.append(s)
+            self._string_ids[s] = sid
+        return sid
+
+    def string(self, sid):
+        """
+        Get a string from the string table of the store.
+
+        :param sid: The ID of the string.
+        :return: The string (or None for -1).
+        """
+        return self._strings[sid] if sid >= 0 else None
+
+    def add(self, node):
+        """
+        Copy a node and its subtree into the store. If the node is already a
+        view of the store, then nothing is copied.
+
+        :param node: The root of the tree to copy.
+        :return: The view of the stored copy of the node.
+        """
+        return self.node(self._add(node))
+
+    def node(self, idx):
+        """
+        Get the view of a stored node.
+
+        :param idx: The index of the node in the store.
+        :return: The view object of the node.
+        """
+        view = self._views.get(idx)
+        if view is None:
+            cls = _view_class(self._classes[self.cls[idx]])
+            view = cls.__new__(cls)
+            view._store = self
+            view._index = idx
+            self._views[idx] = view
+        return view
+
+    def children(self, idx):
+        """
+        Get the indices of the children of a stored rule.
+
+        :param idx: The index of the rule in the store.
+        :return: List of the indices of the children.
+        """
+        children = []
+        child = self.first_child[idx]
+        while child >= 0:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def set_children(self, idx, children):
+        """
+        Replace the children of a stored rule.
+
+        :param idx: The index of the rule in the store.
+        :param children: List of the indices of the new children.
+        """
+        prev = -1
+        for child in children:
+            self.parent[child] = idx
+            self._foreign_parents.pop(child, None)
+            if prev < 0:
+                self.first_child[idx] = child
+            else:
+                self.next_sibling[prev] = child
+            prev = child
+        if prev < 0:
+            self.first_child[idx] = -1
+        else:
+            self.next_sibling[prev] = -1
+
+    def position(self, lines, columns, idx):
+        line = lines[idx]
+        return Position(line, columns[idx]) if line > 0 else None
+
+    def set_position(self, lines, columns, idx, position):
+        lines[idx], columns[idx] = (position.line, position.column) if position is not None else (0, 0)
+
+    def _class_id(self, cls):
+        cid = self._class_ids.get(cls)
+        if cid is None:
+            cid = len(self._classes)
+            self._classes.append(cls)
+            self._class_ids[cls] = cid
+        return cid
+
+    def _add(self, root):
+        def _children(node):
+            if isinstance(node, _StoredNode) and node._store is self:
+                return None
+            return node.children if isinstance(node, HDDRule) else None
+
+        # The stack of the lists of the indices of the children of the rules
+        # being copied (the bottom list holds the index of the copied root).
+        indices = [[]]
+        for node, entering in walk(root, _children):
+            if isinstance(node, _StoredNode) and node._store is self:
+                if entering:
+                    indices[-1].append(node._index)
+                continue
+
+            if entering:
+                indices[-1].append(self._append(node))
+                if isinstance(node, HDDRule):
+                    indices.append([])
+            elif isinstance(node, HDDRule):
+                children = indices.pop()
+                self.set_children(indices[-1][-1], children)
+        return indices[0][0]
+
+    def _append(self, node):
+        """
+        Append a node to the arrays of the store (without its children).
+
+        :param node: The node to append.
+        :return: The index of the appended node.
+        """
+        idx = len(self.parent)
+        self.parent.append(-1)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self.state.append(node.state)
+        for lines, columns, position in ((self.start_line, self.start_column, node.start),
+                                         (self.end_line, self.end_column, node.end)):
+            lines.append(0)
+            columns.append(0)
+            self.set_position(lines, columns, idx, position)
+        self.cls.append(self._class_id(node.__class__.__bases__[1] if isinstance(node, _StoredNode) else node.__class__))
+        self.name.append(self.intern(node.name))
+        self.replace.append(self.intern(node.replace))
+        if isinstance(node, HDDRule):
+            self.text.append(-1)
+        else:
+            self.text.append(self.intern(node.text))
+        return idx
+
+
+_view_classes = {}
+
+
+def _view_class(cls):
+    """
+    Get the view class of a node class, i.e., the class mixing the appropriate
+    view implementation into the node class.
+    """
+    view_cls = _view_classes.get(cls)
+    if view_cls is None:
+        mixin = _StoredRule if issubclass(cls, HDDRule) else _StoredToken
+        view_cls = type(cls.__name__, (mixin, cls), {'__module__': cls.__module__, '__slots__': ('_store', '_index', '__weakref__')})
+        _view_classes[cls] = view_cls
+    return view_cls
+
+
+def compact_tree(tree):
+    """
+    Copy a HDD tree into a new compact store.
+
+    :param tree: The root of the tree to copy.
+    :return: The view of the root of the copy.
+    """
+    return HDDTreeStore().add(tree)
+
+
+class _StoredNode:
+    """
+    Base of node views. Views are never instantiated directly but are created
+    by HDDTreeStore.node, mixed into the class of the original node.
+    """
+    __slots__ = ()
+
+    _store = None
+    _index = -1
+
+    @property
+    def id(self):
+        return self._index
+
+    @property
+    def name(self):
+        return self._store.string(self._store.name[self._index])
+
+    @name.setter
+    def name(self, value):
+        self._store.name[self._index] = self._store.intern(value)
+
+    @property
+    def replace(self):
+        return self._store.string(self._store.replace[self._index])
+
+    @replace.setter
+    def replace(self, value):
+        self._store.replace[self._index] = self._store.intern(value)
+
+    @property
+    def state(self):
+        return self._store.state[self._index]
+
+    @state.setter
+    def state(self, value):
+        self._store.state[self._index] = value
+
+    @property
+    def start(self):
+        return self._store.position(self._store.start_line, self._store.start_column, self._index)
+
+    @start.setter
+    def start(self, value):
+        self._store.set_position(self._store.start_line, self._store.start_column, self._index, value)
+
+    @property
+    def end(self):
+        return self._store.position(self._store.end_line, self._store.end_column, self._index)
+
+    @end.setter
+    def end(self, value):
+        self._store.set_position(self._store.end_line, self._store.end_column, self._index, value)
+
+    @property
+    def parent(self):
+        parent = self._store.parent[self._index]
+        if parent < 0:
+            return self._store._foreign_parents.get(self._index)
+        return self._store.node(parent)
+
+    @parent.setter
+    def parent(self, value):
+        if value is None:
+            self._store.parent[self._index] = -1
+            self._store._foreign_parents.pop(self._index, None)
+        elif isinstance(value, _StoredNode) and value._store is self._store:
+            self._store.parent[self._index] = value._index
+            self._store._foreign_parents.pop(self._index, None)
+        else:
+            # The node has been added to a rule that is not (yet) in the store.
+            self._store.parent[self._index] = -1
+            self._store._foreign_parents[self._index] = value
+
+    def __copy__(self):
+        # Shallow copies are detached from the store, i.e., they are instances
+        # of the original node class.
+        cls = self.__class__.__bases__[1]
+        node = cls.__new__(cls)
+        for attr in ('name', 'replace', 'start', 'end', 'parent', 'state', 'id'):
+            setattr(node, attr, getattr(self, attr))
+        return node
+
+    def __reduce__(self):
+        return self._store.node, (self._index, )
+
+
+class _StoredToken(_StoredNode):
+    __slots__ = ()
+
+    @property
+    def text(self):
+        return self._store.string(self._store.text[self._index])
+
+    @text.setter
+    def text(self, value):
+        self._store.text[self._index] = self._store.intern(value)
+
+    def __copy__(self):
+        node = super().__copy__()
+        node.text = self.text
+        return node
+
+
+class _StoredRule(_StoredNode):
+    __slots__ = ()
+
+    @property
+    def children(self):
+        return _StoredChildren(self._store, self._index)
+
+    @children.setter
+    def children(self, value):
+        _StoredChildren(self._store, self._index)[:] = value
+
+    @property
+    def _unparsed(self):
+        return self._store._unparsed.get(self._index)
+
+    @_unparsed.setter
+    def _unparsed(self, value):
+        if value is None:
+            self._store._unparsed.pop(self._index, None)
+        else:
+            self._store._unparsed[self._index] = value
+
+    @property
+    def _fingerprint(self):
+        return self._store._fingerprints.get(self._index)
+
+    @_fingerprint.setter
+    def _fingerprint(self, value):
+        if value is None:
+            self._store._fingerprints.pop(self._index, None)
+        else:
+            self._store._fingerprints[self._index] = value
+
+    def __copy__(self):
+        node = super().__copy__()
+        node.children = list(self.children)
+        node._unparsed = None
+        node._fingerprint = None
+        return node
+
+
+class _StoredChildren(MutableSequence):
+    """
+    List-like view of the children of a stored rule. The view takes a snapshot
+    of the children when created, and writes all changes through to the store.
+    """
+
+    def __init__(self, store, idx):
+        self._store = store
+        self._index = idx
+        self._children = store.children(idx)
+
+    def __len__(self):
+        return len(self._children)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._store.node(child) for child in self._children[i]]
+        return self._store.node(self._children[i])
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            self._children[i] = [self._store._add(node) for node in value]
+        else:
+            self._children[i] = self._store._add(value)
+        self._store.set_children(self._index, self._children)
+
+    def __delitem__(self, i):
+        del self._children[i]
+        self._store.set_children(self._index, self._children)
+
+    def __iter__(self):
+        return (self._store.node(child) for child in self._children)
+
+    def __reversed__(self):
+        return (self._store.node(child) for child in reversed(self._children))
+
+    def __contains__(self, value):
+        return isinstance(value, _StoredNode) and value._store is self._store and value._index in self._children
+
+    def index(self, value, start=0, stop=None):
+        if isinstance(value, _StoredNode) and value._store is self._store:
+            return self._children.index(value._index, start, stop if stop is not None else len(self._children))
+        raise ValueError(f'{value!r} is not in list')
+
+    def insert(self, index, value):
+        self._children.insert(index, self._store._add(value))
+        self._store.set_children(self._index, self._children)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
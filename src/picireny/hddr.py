@@ -9,6 +9,8 @@
 import itertools
 import logging
 
+from collections import deque
+
 from .prune import prune
 
 logger = logging.getLogger(__name__)
@@ -18,7 +20,7 @@ def hddrmin(hdd_tree, *,
             reduce_class, reduce_config, tester_class, tester_config,
             id_prefix=(), cache=None, unparse_with_whitespace=True,
             config_filter=None, transformations=(prune,), hdd_star=True,
-            pop_first=False, append_reversed=False):
+            pop_first=False, append_reversed=False, checkpoint=None, resume=None):
     """
     Run the recursive variant of the hierarchical delta debugging reduce
     algorithm (a.k.a. HDDr).
@@ -61,22 +63,56 @@ def hddrmin(hdd_tree, *,
     :param pop_first: Boolean to control tree traversal (see above for details).
     :param append_reverse: Boolean to control tree traversal (see above for
         details).
+    :param checkpoint: Function called with the tree and the state of the
+        reduction after every checked node, or None. The state can be passed as
+        `resume` to continue the reduction from that point.
+    :param resume: State of an interrupted reduction (as given to
+        `checkpoint`) to continue from, or None to start from the beginning.
     :return: The reduced test case (1-tree-minimal if hdd_star is True and
         config_filter is None).
     """
 
-    for iter_cnt in itertools.count():
+    for step_tree in hddrmin_steps(hdd_tree,
+                                   reduce_class=reduce_class, reduce_config=reduce_config,
+                                   tester_class=tester_class, tester_config=tester_config,
+                                   id_prefix=id_prefix, cache=cache, unparse_with_whitespace=unparse_with_whitespace,
+                                   config_filter=config_filter, transformations=transformations, hdd_star=hdd_star,
+                                   pop_first=pop_first, append_reversed=append_reversed,
+                                   checkpoint=checkpoint, resume=resume):
+        hdd_tree = step_tree
+
+    return hdd_tree
+
+
+def hddrmin_steps(hdd_tree, *,
+                  reduce_class, reduce_config, tester_class, tester_config,
+                  id_prefix=(), cache=None, unparse_with_whitespace=True,
+                  config_filter=None, transformations=(prune,), hdd_star=True,
+                  pop_first=False, append_reversed=False, checkpoint=None, resume=None):
+    """
+    Run HDDr step by step. The generator yields the root of the (partially
+    reduced) tree after every node whose children have been checked, thus the
+    reduction can be suspended between steps (e.g., to save the current state
+    of the tree or to interleave it with other work) and resumed by advancing
+    the generator. Exhausting the generator gives the same result as hddrmin.
+
+    For the description of the parameters, see hddrmin.
+    """
+
+    if resume:
+        iter_cnt_start, node_cnt_start, changed, queue = resume['iteration'], resume['node'], resume['changed'], resume['queue']
+    else:
+        iter_cnt_start, node_cnt_start, changed, queue = 0, 0, False, [hdd_tree]
+
+    for iter_cnt in itertools.count(iter_cnt_start):
         logger.info('Iteration #%d', iter_cnt)
 
-        changed = False
-        queue = [hdd_tree]
-        for node_cnt in itertools.count():
+        queue = deque(queue)
+        pop = queue.popleft if pop_first else queue.pop
+        for node_cnt in itertools.count(node_cnt_start):
             if not queue:
                 break
-            if pop_first:
-                queue, node = queue[1:], queue[0]
-            else:
-                queue, node = queue[:-1], queue[-1]
+            node = pop()
             if not hasattr(node, 'children') or node.state != node.KEEP:
                 continue
 
@@ -97,11 +133,15 @@ def hddrmin(hdd_tree, *,
 
                     changed = changed or transformed
 
-            for child in node.children if not append_reversed else reversed(node.children):
-                if child.state == child.KEEP:
-                    queue.append(child)
+            queue.extend(child for child in (node.children if not append_reversed else reversed(node.children))
+                         if child.state == child.KEEP)
+
+            if children:
+                if checkpoint:
+                    checkpoint(hdd_tree, {'iteration': iter_cnt, 'node': node_cnt + 1, 'changed': changed, 'queue': queue})
+                yield hdd_tree
 
         if not hdd_star or not changed:
             break
 
-    return hdd_tree
+        node_cnt_start, changed, queue = 0, False, [hdd_tree]
@@ -1,4 +1,4 @@
-# Copyright (c) 2021-2023 Renata Hodovan, Akos Kiss.
+# Copyright (c) 2021-2024 Renata Hodovan, Akos Kiss.
 # Copyright (c) 2021 Daniel Vince.
 #
 # Licensed under the BSD 3-Clause License
@@ -9,7 +9,11 @@
 import itertools
 import logging
 
-from picire import AbstractDD, Outcome
+from multiprocessing import Value
+
+from picire import AbstractDD, AbstractParallelDD, ConfigCache, Outcome, parallel_loop, shared_cache_decorator
+
+from .traversal import fold, walk
 
 logger = logging.getLogger(__name__)
 
@@ -33,23 +37,52 @@ class HoistingTestBuilder:
             elements to new ones.
         :return: The unparsed test case with the mappings applied.
         """
+        return self.tree.unparse(with_whitespace=self.with_whitespace, **self._transform(mapping_config))
+
+    def chunks(self, mapping_config):
+        """
+        :param mapping_config: A list of mappings of initial configuration
+            elements to new ones.
+        :return: Generator of the chunks of the unparsed test case with the
+            mappings applied.
+        """
+        return self.tree.unparse_chunks(with_whitespace=self.with_whitespace, **self._transform(mapping_config))
+
+    def fingerprint(self, mapping_config):
+        """
+        :param mapping_config: A list of mappings of initial configuration
+            elements to new ones.
+        :return: The fingerprint of the test case with the mappings applied
+            (without unparsing it).
+        """
+        return self.tree.fingerprint(with_whitespace=self.with_whitespace, **self._transform(mapping_config))
+
+    @staticmethod
+    def _transform(mapping_config):
+        # Nodes are matched by their IDs, as the configuration may arrive in
+        # a copy (e.g., when the test builder runs in a shared cache process).
         def map(node):
-            return mapping.get(node, node)
+            return mapping.get(node.id, node)
 
-        mapping = dict(mapping_config)
-        return self.tree.unparse(with_whitespace=self.with_whitespace, transform=map)
+        mapping = {c.id: m for c, m in mapping_config}
+        return {'transform': map, 'transformed': [c for c, _ in mapping_config]}
 
 
 class MappingMin(AbstractDD):
 
-    def __init__(self, test, *, cache=None, id_prefix=None):
+    def __init__(self, test, *, cache=None, id_prefix=None, fingerprint=None):
         """
         :param test: A callable tester object.
         :param cache: Cache object to use.
         :param id_prefix: Tuple to prepend to config IDs during tests.
+        :param fingerprint: A function computing the fingerprint of the test
+            case of a candidate mapping (without building it), or None. If
+            given, candidates yielding an already tested test case are skipped.
         """
 
         super().__init__(test=test, split=None, cache=cache, id_prefix=id_prefix)
+        self._fingerprint = fingerprint
+        self._tested = set()
 
     def __call__(self, config):
         """
@@ -60,22 +93,9 @@ class MappingMin(AbstractDD):
         :return: A mapping of initial configuration elements to new ones.
         """
 
-        def collect_hoistables(node):
-            def _collect_hoistables(desc):
-                if desc.name == node.name:
-                    hoistables.append(desc)
-                    return
-                if hasattr(desc, 'children') and desc.state == desc.KEEP:
-                    for child in desc.children:
-                        _collect_hoistables(child)
-
-            hoistables = []
-            if hasattr(node, 'children') and node.state == node.KEEP and node.name:
-                for child in node.children:
-                    _collect_hoistables(child)
-            return hoistables
-
+        hoistables = self._index_hoistables(config)
         mapping = {}
+        self._tested.clear()
 
         for run in itertools.count():
             logger.info('Run #%d', run)
@@ -83,24 +103,193 @@ class MappingMin(AbstractDD):
             if logger.isEnabledFor(logging.DEBUG):
                 logger.debug('\tMapping: %r', {c.id: m.id for c, m in mapping.items()})
 
-            for i, (c, m) in enumerate((c, m) for c in config for m in collect_hoistables(mapping.get(c, c))):
-                new_mapping = mapping.copy()
-                new_mapping[c] = m
-                mapping_config = list(new_mapping.items())
-                config_id = (f'r{run}', f'm{i}')
-
-                outcome = self._lookup_cache(mapping_config, config_id) or self._test_config(mapping_config, config_id)
-
-                if outcome is Outcome.FAIL:
-                    mapping = new_mapping
-                    logger.info('\tHoisted')
-                    break
-            else:
+            next_mapping = self._reduce_mapping(run, config, mapping, hoistables)
+            if next_mapping is None:
                 break
 
+            mapping = next_mapping
+            logger.info('\tHoisted')
+
         logger.info('\tDone')
         return mapping
 
+    @staticmethod
+    def _index_hoistables(config):
+        """
+        Index the hoistable descendants of the nodes in the subtrees of the
+        configuration. The hoistable descendants of a (kept and named) rule are
+        its nearest descendants of the same name, i.e., those that are
+        reachable through kept rules without passing through another node of
+        the same name.
+
+        The index is built in a single traversal by keeping track of the
+        innermost open rule of every name. As hoisting a node only exposes the
+        hoistable descendants of the hoisted node (which are indexed, too), the
+        index stays valid for all the mappings computed by MappingMin.
+
+        :param config: The initial configuration.
+        :return: Dictionary mapping node IDs to the list of the hoistable
+            descendants of the nodes.
+        """
+
+        def _children(node):
+            return node.children if hasattr(node, 'children') and node.state == node.KEEP else None
+
+        hoistables = {}
+        open_rules = {}
+        for c in config:
+            for node, entering in walk(c, _children):
+                if not entering:
+                    if node.name and hasattr(node, 'children') and node.state == node.KEEP:
+                        open_rules[node.name].pop()
+                    continue
+
+                if node.name:
+                    ancestors = open_rules.get(node.name)
+                    if ancestors:
+                        hoistables[ancestors[-1].id].append(node)
+
+                if hasattr(node, 'children') and node.state == node.KEEP and node.name:
+                    hoistables[node.id] = []
+                    open_rules.setdefault(node.name, []).append(node)
+        return hoistables
+
+    @staticmethod
+    def _candidates(config, mapping, hoistables):
+        """
+        Generate the candidate hoistings that extend the current mapping.
+
+        :param config: The initial configuration.
+        :param mapping: The current mapping.
+        :param hoistables: The index of the hoistable descendants of nodes.
+        :return: Generator of (config element, hoistable descendant) pairs.
+        """
+        for c in config:
+            for m in hoistables.get(mapping.get(c, c).id, ()):
+                yield c, m
+
+    @staticmethod
+    def _extend_mapping(mapping, c, m):
+        new_mapping = mapping.copy()
+        new_mapping[c] = m
+        return new_mapping
+
+    def _is_duplicate(self, mapping_config):
+        """
+        Check whether the test case of a candidate mapping has been tested (or
+        dispatched for testing) already during the current call, and register
+        it if not. As the first failing candidate ends a run, the outcome of
+        the already tested test cases is not interesting.
+
+        :param mapping_config: The list of pairs of the candidate mapping.
+        :return: True if the candidate can be skipped, False otherwise.
+        """
+        if not self._fingerprint:
+            return False
+        fingerprint = self._fingerprint(mapping_config)
+        if fingerprint in self._tested:
+            return True
+        self._tested.add(fingerprint)
+        return False
+
+    def _reduce_mapping(self, run, config, mapping, hoistables):
+        """
+        Test the candidate mappings one by one.
+
+        :param run: The index of the current iteration.
+        :param config: The initial configuration.
+        :param mapping: The current mapping.
+        :param hoistables: The index of the hoistable descendants of nodes.
+        :return: The first failing candidate mapping or None.
+        """
+        for i, (c, m) in enumerate(self._candidates(config, mapping, hoistables)):
+            new_mapping = self._extend_mapping(mapping, c, m)
+            mapping_config = list(new_mapping.items())
+            config_id = (f'r{run}', f'm{i}')
+
+            if self._is_duplicate(mapping_config):
+                continue
+
+            outcome = self._lookup_cache(mapping_config, config_id) or self._test_config(mapping_config, config_id)
+            if outcome is Outcome.FAIL:
+                return new_mapping
+
+        return None
+
+
+class ParallelMappingMin(MappingMin):
+
+    def __init__(self, test, *, cache=None, id_prefix=None, fingerprint=None,
+                 proc_num=None, max_utilization=None):
+        """
+        :param test: A callable tester object.
+        :param cache: Cache object to use.
+        :param id_prefix: Tuple to prepend to config IDs during tests.
+        :param fingerprint: A function computing the fingerprint of the test
+            case of a candidate mapping (see MappingMin).
+        :param proc_num: The level of parallelization.
+        :param max_utilization: The maximum CPU utilization accepted.
+        """
+        cache = cache or shared_cache_decorator(ConfigCache)()
+        super().__init__(test, cache=cache, id_prefix=id_prefix, fingerprint=fingerprint)
+
+        self._proc_num = proc_num
+        self._max_utilization = max_utilization
+        self._fail_index = Value('i', -1, lock=False)
+
+    def _loop_body(self, mapping_config, index, config_id):
+        """
+        The function that will be run in parallel.
+
+        :param mapping_config: The list of pairs of the candidate mapping.
+        :param index: The index of the candidate mapping.
+        :param config_id: The unique ID of the candidate mapping.
+        :return: True if the test is not interesting, False otherwise.
+        """
+        if self._test_config(mapping_config, config_id) is Outcome.FAIL:
+            self._fail_index.value = index
+            return False
+
+        return True
+
+    def _reduce_mapping(self, run, config, mapping, hoistables):
+        """
+        Test the candidate mappings in parallel. As soon as a failing candidate
+        is found, the tests of the others are cancelled.
+
+        :param run: The index of the current iteration.
+        :param config: The initial configuration.
+        :param mapping: The current mapping.
+        :param hoistables: The index of the hoistable descendants of nodes.
+        :return: A failing candidate mapping or None.
+        """
+        candidates = []
+        self._fail_index.value = -1
+        ploop = parallel_loop.Loop(self._proc_num, self._max_utilization)
+        for i, (c, m) in enumerate(self._candidates(config, mapping, hoistables)):
+            candidates.append((c, m))
+            mapping_config = list(self._extend_mapping(mapping, c, m).items())
+            config_id = (f'r{run}', f'm{i}')
+
+            if self._is_duplicate(mapping_config):
+                continue
+
+            outcome = self._lookup_cache(mapping_config, config_id)
+            if outcome is Outcome.PASS:
+                continue
+            if outcome is Outcome.FAIL:
+                self._fail_index.value = i
+                ploop.brk()
+                break
+
+            if not ploop.do(self._loop_body, (mapping_config, i, config_id)):
+                # If do() returned False, the test was not started.
+                break
+        ploop.join()
+
+        fvalue = self._fail_index.value
+        return self._extend_mapping(mapping, *candidates[fvalue]) if fvalue != -1 else None
+
 
 def hoist(hdd_tree, config_nodes, *,
           reduce_class=None, reduce_config=None, tester_class, tester_config,
@@ -110,10 +299,12 @@ def hoist(hdd_tree, config_nodes, *,
 
     :param hdd_tree: The root of the tree that the reduce will work with.
     :param config_nodes: Nodes from one level collected by the HDD algorithm.
-    :param reduce_class: Unused, present for being compatible with 'prune'
-        transformation.
-    :param reduce_config: Unused, present for being compatible with 'prune'
-        transformation.
+    :param reduce_class: Reference to the reducer class of the 'prune'
+        transformation. If it is a parallel reducer, then hoisting candidates
+        are also tested in parallel.
+    :param reduce_config: Dictionary containing the parameters of the
+        reduce_class init function. Only the parameters related to
+        parallelization (proc_num, max_utilization) are used.
     :param tester_class: Reference to a callable class that can decide about the
         interestingness of a test case.
     :param tester_config: Dictionary containing the parameters of the tester
@@ -135,15 +326,27 @@ def hoist(hdd_tree, config_nodes, *,
         cache.set_test_builder(test_builder)
 
     test = tester_class(test_builder=test_builder, **tester_config)
-    mapping_min = MappingMin(test, cache=cache, id_prefix=id_prefix)
+    if reduce_class is not None and issubclass(reduce_class, AbstractParallelDD):
+        mapping_min = ParallelMappingMin(test, cache=cache, id_prefix=id_prefix, fingerprint=test_builder.fingerprint,
+                                         proc_num=reduce_config.get('proc_num'),
+                                         max_utilization=reduce_config.get('max_utilization'))
+    else:
+        mapping_min = MappingMin(test, cache=cache, id_prefix=id_prefix, fingerprint=test_builder.fingerprint)
     mapping = mapping_min(config_nodes)
 
-    def _apply_mapping(node):
+    # The mapped nodes are descended into (instead of the original ones), and
+    # the original nodes are replaced with the mapped ones bottom-up.
+    def _children(node):
+        node = mapping.get(node, node)
+        return node.children if hasattr(node, 'children') else None
+
+    def _apply_mapping(node, mapped_children):
         node = mapping.get(node, node)
         if hasattr(node, 'children'):
-            for i, child in enumerate(node.children):
-                node.children[i].replace_with(_apply_mapping(child))
+            for child, mapped_child in zip(list(node.children), mapped_children):
+                if mapped_child is not child:
+                    child.replace_with(mapped_child)
         return node
-    hdd_tree = _apply_mapping(hdd_tree)
+    hdd_tree = fold(hdd_tree, _children, _apply_mapping)
 
     return hdd_tree, bool(mapping)
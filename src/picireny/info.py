@@ -6,6 +6,12 @@
 # according to those terms.
 
 from .hdd_tree import HDDRule
+from .traversal import fold, preorder, walk
+
+
+def _children(node):
+    # Sub-trees of removed rules are never visited.
+    return node.children if isinstance(node, HDDRule) and node.state == node.KEEP else None
 
 
 def count(node, *, removed=False):
@@ -18,21 +24,16 @@ def count(node, *, removed=False):
     :param node: The root of the tree to do the counting for.
     :return: A dictionary of counts indexed by node type name.
     """
-    def _count(node):
-        if node.state != node.KEEP and not removed:
-            return
+    stats = {}
+    for current in preorder(node, _children):
+        if current.state != current.KEEP and not removed:
+            continue
 
-        ty = node.__class__.__name__
+        ty = current.__class__.__name__
         if ty not in stats:
             stats[ty] = 0
         stats[ty] += 1
 
-        if isinstance(node, HDDRule) and node.state == node.KEEP:
-            for child in node.children:
-                _count(child)
-
-    stats = {}
-    _count(node)
     return stats
 
 
@@ -46,11 +47,13 @@ def height(node, *, removed=False):
     :param node: The root of the tree to do the calculation for.
     :return: The height of the tree.
     """
-    if node.state != node.KEEP and not removed:
-        return 0
+    def _height(node, child_heights):
+        if node.state != node.KEEP and not removed:
+            return 0
 
-    return 1 + (max((height(child) for child in node.children), default=0)
-                if isinstance(node, HDDRule) and node.state == node.KEEP else 0)
+        return 1 + max(child_heights, default=0)
+
+    return fold(node, _children, _height)
 
 
 def shape(node, *, removed=False):
@@ -64,18 +67,19 @@ def shape(node, *, removed=False):
     :param node: The root of the tree to do the calculation for.
     :return: A list of level sizes.
     """
-    def _shape(node, level):
-        if node.state != node.KEEP and not removed:
-            return
+    sizes = []
+    level = -1
+    for current, entering in walk(node, _children):
+        if not entering:
+            level -= 1
+            continue
+        level += 1
+
+        if current.state != current.KEEP and not removed:
+            continue
 
         if len(sizes) <= level:
             sizes.extend([0] * (level - len(sizes) + 1))
         sizes[level] += 1
 
-        if isinstance(node, HDDRule) and node.state == node.KEEP:
-            for child in node.children:
-                _shape(child, level + 1)
-
-    sizes = []
-    _shape(node, 0)
     return sizes
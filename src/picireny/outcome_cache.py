@@ -0,0 +1,138 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import hashlib
+import sqlite3
+
+from collections import OrderedDict
+
+from picire import Outcome, OutcomeCache
+
+
+class LRUContentCache(OutcomeCache):
+    """
+    Cache the outcome of test cases by the fingerprint (hash digest) of their
+    content.
+
+    As the content of a test case does not depend on how it was built, the
+    entries stay valid when the test builder changes, i.e., across the levels,
+    iterations and phases of HDD. Therefore, clearing the cache is a no-op.
+    (This is also the case with picire's ContentCache, but that stores the
+    whole content of the test cases as keys and grows without bounds.) If the
+    size of the cache is limited, the least recently used entries are evicted
+    first.
+    """
+
+    def __init__(self, max_size=None):
+        """
+        :param max_size: The maximum number of outcomes to keep, or None for
+            unlimited.
+        """
+        self.container = OrderedDict()
+        self.test_builder = None
+        self.max_size = max_size
+
+    def _key(self, config):
+        # Test builders of picireny can fingerprint the content of a test case
+        # without building it, thus test cases are only built when tested.
+        fingerprint = getattr(self.test_builder, 'fingerprint', None)
+        if fingerprint:
+            return fingerprint(config)
+        return hashlib.blake2b(self.test_builder(config).encode('utf-8'), digest_size=16).digest()
+
+    def set_test_builder(self, test_builder):
+        self.test_builder = test_builder
+
+    def _add(self, key, result):
+        self.container[key] = result
+        self.container.move_to_end(key)
+        if self.max_size is not None:
+            while len(self.container) > self.max_size:
+                self.container.popitem(last=False)
+
+    def _lookup(self, key):
+        result = self.container.get(key)
+        if result is not None:
+            self.container.move_to_end(key)
+        return result
+
+    def add(self, config, result):
+        self._add(self._key(config), result)
+
+    def lookup(self, config):
+        return self._lookup(self._key(config))
+
+    def __str__(self):
+        entries = ''.join(f'\t{k.hex()}: {v.name!r},\n' for k, v in self.container.items())
+        return f'{{\n{entries}}}'
+
+
+class PersistentContentCache(LRUContentCache):
+    """
+    Content cache backed by an SQLite database, so that the outcomes of the
+    tests are kept across reduction runs (e.g., when a reduction is restarted
+    after an interruption or repeated with a different configuration). The
+    outcomes are stored together with the identity of the tester that has
+    produced them, and only those of the same tester are looked up. The
+    in-memory part of the cache works as that of LRUContentCache, but the
+    stored outcomes are keyed by a cryptographic digest of the content of the
+    test cases (as they are compared to the outcomes of test cases of other
+    runs, too, where a collision of the cheaper fingerprints could go
+    unnoticed).
+    """
+
+    def __init__(self, path, *, tester_id, max_size=None):
+        """
+        :param path: Path to the SQLite database file (created if it does not
+            exist).
+        :param tester_id: String identifying the tester (i.e., the outcomes of
+            tests with the same content and tester are considered equal).
+        :param max_size: The maximum number of outcomes to keep in memory, or
+            None for unlimited.
+        """
+        super().__init__(max_size=max_size)
+        self.tester_id = tester_id
+        # The cache may be accessed from several threads when shared between
+        # parallel processes, but the accesses are serialized by the sharing
+        # wrapper.
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS outcomes '
+                        '(tester TEXT, digest BLOB, outcome TEXT, PRIMARY KEY (tester, digest))')
+        # The digest of the last test case looked up, as it is usually added
+        # right after the lookup (if it was not found).
+        self._last_digest = None, None
+
+    def _digest(self, key, config):
+        last_key, digest = self._last_digest
+        if last_key != key:
+            # Test builders of picireny can build the content of a test case
+            # chunk by chunk, thus the test case is not built in memory as a
+            # whole to digest it.
+            h = hashlib.blake2b(digest_size=32)
+            chunks = getattr(self.test_builder, 'chunks', None)
+            for chunk in chunks(config) if chunks else [self.test_builder(config)]:
+                h.update(chunk.encode('utf-8'))
+            digest = h.digest()
+            self._last_digest = key, digest
+        return digest
+
+    def add(self, config, result):
+        key = self._key(config)
+        self._add(key, result)
+        self.db.execute('INSERT OR REPLACE INTO outcomes VALUES (?, ?, ?)', (self.tester_id, self._digest(key, config), result.name))
+
+    def lookup(self, config):
+        key = self._key(config)
+        result = self._lookup(key)
+        if result is None:
+            row = self.db.execute('SELECT outcome FROM outcomes WHERE tester = ? AND digest = ?',
+                                  (self.tester_id, self._digest(key, config))).fetchone()
+            if row is not None:
+                result = Outcome[row[0]]
+                self._add(key, result)
+        return result
@@ -11,22 +11,24 @@ from copy import copy
 
 from picire import AbstractDD, Outcome
 
+from .traversal import preorder
+
 logger = logging.getLogger(__name__)
 
 
 class PruningTestBuilder:
 
-    def __init__(self, tree, ids, *, with_whitespace=True):
+    def __init__(self, tree, nodes, *, with_whitespace=True):
         """
         Initialize the test builder.
 
         :param tree: Tree representing the current test case.
-        :param ids: The IDs of nodes that can change status.
+        :param nodes: The nodes that can change status.
         :param with_whitespace: Unparse by adding whitespace between nonadjacent
             nodes.
         """
         self.tree = tree
-        self.ids = ids
+        self.nodes = {node.id: node for node in nodes}
         self.with_whitespace = with_whitespace
 
     def __call__(self, config):
@@ -36,15 +38,37 @@ class PruningTestBuilder:
         :return: The unparsed test case containing only the units defined in
             config.
         """
+        return self.tree.unparse(with_whitespace=self.with_whitespace, **self._transform(config))
+
+    def chunks(self, config):
+        """
+        :param config: List of IDs of nodes that will be kept in the next test
+            case.
+        :return: Generator of the chunks of the unparsed test case containing
+            only the units defined in config.
+        """
+        return self.tree.unparse_chunks(with_whitespace=self.with_whitespace, **self._transform(config))
+
+    def fingerprint(self, config):
+        """
+        :param config: List of IDs of nodes that will be kept in the next test
+            case.
+        :return: The fingerprint of the test case containing only the units
+            defined in config (without unparsing it).
+        """
+        return self.tree.fingerprint(with_whitespace=self.with_whitespace, **self._transform(config))
+
+    def _transform(self, config):
         def removed(node):
-            if node.id in self.ids and node.id not in config:
+            if node.id in self.nodes and node.id not in config:
                 removed_node = copy(node)
                 removed_node.state = removed_node.REMOVED
                 return removed_node
             return node
 
         config = set(config)
-        return self.tree.unparse(with_whitespace=self.with_whitespace, transform=removed)
+        return {'transform': removed,
+                'transformed': [node for node_id, node in self.nodes.items() if node_id not in config]}
 
 
 class EmptyDD(AbstractDD):
@@ -121,7 +145,7 @@ def prune(hdd_tree, config_nodes, *,
     config_ids = [node.id for node in config_nodes]
     config_ids_set = set(config_ids)
 
-    test_builder = PruningTestBuilder(hdd_tree, config_ids_set, with_whitespace=unparse_with_whitespace)
+    test_builder = PruningTestBuilder(hdd_tree, config_nodes, with_whitespace=unparse_with_whitespace)
     if cache:
         cache.clear()
         cache.set_test_builder(test_builder)
@@ -134,12 +158,16 @@ def prune(hdd_tree, config_nodes, *,
         c = dd(c)
     c = set(c)
 
-    def _set_state(node):
+    def _children(node):
+        if node.id not in config_ids_set and hasattr(node, 'children') and node.state == node.KEEP:
+            return node.children
+        return None
+
+    for node in preorder(hdd_tree, _children):
         if node.id in config_ids_set:
-            node.state = node.KEEP if node.id in c else node.REMOVED
-        elif hasattr(node, 'children') and node.state == node.KEEP:
-            for child in node.children:
-                _set_state(child)
-    _set_state(hdd_tree)
+            state = node.KEEP if node.id in c else node.REMOVED
+            if node.state != state:
+                node.state = state
+                node.invalidate()
 
     return hdd_tree, len(c) < len(config_ids_set)
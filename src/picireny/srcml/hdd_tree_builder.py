@@ -12,34 +12,56 @@ from subprocess import CalledProcessError, PIPE, run
 
 from ..hdd_tree import HDDRule, HDDToken, Position
 from ..transform import remove_empty_nodes
+from ..traversal import walk
 
 
 logger = logging.getLogger(__name__)
 
 
-def build_hdd_tree(element, start):
-    name = element.tag
-    name = name.replace('{http://www.srcML.org/srcML/src}', 'src:')
-    name = name.replace('{http://www.srcML.org/srcML/cpp}', 'cpp:')
-    name = name.replace('{http://www.srcML.org/srcML/position}', 'pos:')
+def build_hdd_tree(root, start, strings):
+    def intern(s):
+        return strings.setdefault(s, s)
 
-    rule = HDDRule(name, start=start, end=start, replace='')
-    result = [rule]
+    def children(element):
+        return [child for child in element if not child.tag.startswith('{http://www.srcML.org/srcML/position}')]
 
-    if element.text:
-        end = start.after(element.text)
-        rule.add_child(HDDToken(f'{name}@text', element.text, start=start, end=end, replace=element.text))
-        rule.end = end
+    # The rules of the elements being built (i.e., of the ancestors of the
+    # current element) are kept on a stack.
+    rules = []
+    result = []
+    for element, entering in walk(root, children):
+        if entering:
+            name = element.tag
+            name = name.replace('{http://www.srcML.org/srcML/src}', 'src:')
+            name = name.replace('{http://www.srcML.org/srcML/cpp}', 'cpp:')
+            name = name.replace('{http://www.srcML.org/srcML/position}', 'pos:')
+            name = intern(name)
 
-    for child in list(element):
-        if child.tag.startswith('{http://www.srcML.org/srcML/position}'):
+            rule_start = rules[-1].end if rules else start
+            rule = HDDRule(name, start=rule_start, end=rule_start, replace='')
+
+            if element.text:
+                text = intern(element.text)
+                end = rule_start.after(text)
+                rule.add_child(HDDToken(intern(f'{name}@text'), text, start=rule_start, end=end, replace=text))
+                rule.end = end
+
+            rules.append(rule)
             continue
-        for node in build_hdd_tree(child, rule.end):
-            rule.add_child(node)
-            rule.end = rule.children[-1].end
 
-    if element.tail:
-        result += [HDDToken(f'{name}@tail', element.tail, start=rule.end, end=rule.end.after(element.tail), replace=element.tail)]
+        rule = rules.pop()
+        nodes = [rule]
+        if element.tail:
+            tail = intern(element.tail)
+            nodes.append(HDDToken(intern(f'{rule.name}@tail'), tail, start=rule.end, end=rule.end.after(tail), replace=tail))
+
+        if rules:
+            parent = rules[-1]
+            for node in nodes:
+                parent.add_child(node)
+                parent.end = parent.children[-1].end
+        else:
+            result = nodes
 
     return result
 
@@ -62,7 +84,8 @@ def create_hdd_tree(src, *, language):
 
     root = ET.fromstring(stdout)
 
-    tree_result = build_hdd_tree(root, Position())
+    # Names and texts of tokens are deduplicated to save memory.
+    tree_result = build_hdd_tree(root, Position(), {})
     assert len(tree_result) == 1
     tree = tree_result[0]
 
@@ -0,0 +1,59 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import os
+import shutil
+
+from subprocess import run
+
+from picire import Outcome, SubprocessTest
+
+
+class StreamingSubprocessTest(SubprocessTest):
+    """
+    Variant of picire's SubprocessTest that writes the test case into the file
+    of the test chunk by chunk, if the test builder supports it (i.e., has a
+    `chunks` method, like the test builders of picireny). Thus, the test case
+    is not built in memory as a whole, which keeps the memory footprint of
+    large test cases low, especially when several tests run in parallel.
+    """
+
+    def __call__(self, config, config_id):
+        """
+        Save and evaluate a configuration.
+
+        :param config: The configuration to build the test case from.
+        :param config_id: Unique ID of the configuration. It is used to name the
+            containing folder of the test.
+        :return: The evaluation of the test. It's either FAIL or PASS.
+        """
+        test_dir = os.path.join(self.work_dir, '_'.join(str(i) for i in config_id))
+        test_path = os.path.join(test_dir, self.filename)
+
+        os.makedirs(test_dir, exist_ok=True)
+
+        chunks = getattr(self.test_builder, 'chunks', None)
+        # No newline translation, like codecs.open in picire's SubprocessTest.
+        with open(test_path, 'w', encoding=self.encoding, errors='ignore', newline='') as f:
+            if chunks:
+                f.writelines(chunks(config))
+            else:
+                f.write(self.test_builder(config))
+
+        args = []
+        for arg in self.command_pattern:
+            try:
+                arg = arg % test_path
+            except TypeError:
+                pass
+            args.append(arg)
+        returncode = run(args, cwd=test_dir, check=False).returncode
+
+        if self.cleanup:
+            shutil.rmtree(test_dir)
+
+        return Outcome.FAIL if returncode == 0 else Outcome.PASS
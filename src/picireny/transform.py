@@ -5,7 +5,16 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
-from .hdd_tree import HDDRule, HDDToken
+from .hdd_tree import HDDRule, HDDToken, text_fingerprint
+from .traversal import fold, postorder, preorder
+
+
+def _children(node):
+    return node.children if isinstance(node, HDDRule) else None
+
+
+def _kept_children(node):
+    return node.children if isinstance(node, HDDRule) and node.state == node.KEEP else None
 
 
 def remove_empty_nodes(node):
@@ -17,10 +26,13 @@ def remove_empty_nodes(node):
     :param node: The root of the tree to be transformed.
     :return: The root of the transformed tree.
     """
-    if isinstance(node, HDDRule):
+    for rule in postorder(node, _children):
+        if not isinstance(rule, HDDRule):
+            continue
+
         non_empty_children = []
 
-        for child in node.children:
+        for child in rule.children:
             if isinstance(child, HDDToken):
                 # empty token is usually the EOF only (but interestingly, it may
                 # appear multiple times in the tree)
@@ -28,7 +40,6 @@ def remove_empty_nodes(node):
                     non_empty_children.append(child)
             else:
                 assert isinstance(child, HDDRule)
-                remove_empty_nodes(child)
 
                 # a grammar may contain lambda rules (with nothing on the
                 # right-hand side, or with an empty alternative), or rules that
@@ -36,7 +47,8 @@ def remove_empty_nodes(node):
                 if child.children:
                     non_empty_children.append(child)
 
-        node.children[:] = non_empty_children
+        rule.children[:] = non_empty_children
+        rule.invalidate()
 
     return node
 
@@ -55,30 +67,30 @@ def flatten_recursion(node):
     :param node: The root of the tree to be transformed.
     :return: The root of the transformed tree.
     """
-    if isinstance(node, HDDRule) and node.state == node.KEEP:
-        for child in node.children:
-            flatten_recursion(child)
+    for rule in postorder(node, _kept_children):
+        if not isinstance(rule, HDDRule) or rule.state != rule.KEEP:
+            continue
 
-        if len(node.children) > 1 and node.name:
-            if node.children[0].name == node.name:
-                left = node.children[0]
+        if len(rule.children) > 1 and rule.name:
+            if rule.children[0].name == rule.name:
+                left = rule.children[0]
 
-                right = HDDRule('', replace='', start=node.children[1].start, end=node.children[-1].end)
-                right.add_children(node.children[1:])
-                del node.children[:]
+                right = HDDRule('', replace='', start=rule.children[1].start, end=rule.children[-1].end)
+                right.add_children(rule.children[1:])
+                del rule.children[:]
 
-                node.add_children(left.children)
-                node.add_child(right)
+                rule.add_children(left.children)
+                rule.add_child(right)
 
-            elif node.children[-1].name == node.name:
-                right = node.children[-1]
+            elif rule.children[-1].name == rule.name:
+                right = rule.children[-1]
 
-                left = HDDRule('', replace='', start=node.children[0].start, end=node.children[-2].end)
-                left.add_children(node.children[0:-1])
-                del node.children[:]
+                left = HDDRule('', replace='', start=rule.children[0].start, end=rule.children[-2].end)
+                left.add_children(rule.children[0:-1])
+                del rule.children[:]
 
-                node.add_child(left)
-                node.add_children(right.children)
+                rule.add_child(left)
+                rule.add_children(right.children)
 
         # This only seems to happen if there was some error during parsing.
         # In this case a weird 1-step chain gets inserted into the left/right-
@@ -86,11 +98,11 @@ def flatten_recursion(node):
         # merging of this 1-step chain to squeeze_tree because flatten_recursion
         # is usually not called again afterwards. So, do a degenerate "rotation"
         # (i.e., simple lifting) here.
-        if len(node.children) == 1 and node.name:
-            if node.children[0].name == node.name:
-                child = node.children[0]
-                del node.children[:]
-                node.add_children(child.children)
+        if len(rule.children) == 1 and rule.name:
+            if rule.children[0].name == rule.name:
+                child = rule.children[0]
+                del rule.children[:]
+                rule.add_children(child.children)
 
     return node
 
@@ -104,16 +116,18 @@ def squeeze_tree(node):
     :param node: The root of the tree to be transformed.
     :return: The root of the transformed tree.
     """
-    if isinstance(node, HDDRule):
-        for i, child in enumerate(node.children):
-            squeezed_child = squeeze_tree(child)
-            if child != squeezed_child:
-                node.children[i].replace_with(squeezed_child)
+    def _squeeze(node, squeezed_children):
+        if isinstance(node, HDDRule):
+            for i, (child, squeezed_child) in enumerate(zip(node.children, squeezed_children)):
+                if child != squeezed_child:
+                    node.children[i].replace_with(squeezed_child)
 
-        if len(node.children) == 1 and node.children[0].replace == node.replace:
-            return node.children[0]
+            if len(node.children) == 1 and node.children[0].replace == node.replace:
+                return node.children[0]
 
-    return node
+        return node
+
+    return fold(node, _children, _squeeze)
 
 
 def skip_unremovable(node, *, unparse_with_whitespace=True):
@@ -122,15 +136,20 @@ def skip_unremovable(node, *, unparse_with_whitespace=True):
     is the same tokens as their minimal replacement, thus hiding them from
     hddmin, because they just cause extra test runs but cannot reduce the input.
 
+    The nodes are checked bottom-up by comparing the fingerprints of their
+    unparsing and of their replacement. As the fingerprints of the children
+    are memoized, the whole pass is linear in the size of the tree. Texts are
+    only compared (to rule out hash collisions) if the fingerprints match, in
+    which case the unparsing is as short as the replacement.
+
     :param node: The root of the tree to be transformed.
     :return: The root of the transformed tree.
     """
-    if isinstance(node, HDDRule):
-        for child in node.children:
-            skip_unremovable(child, unparse_with_whitespace=unparse_with_whitespace)
-
-    if node.unparse(with_whitespace=unparse_with_whitespace) == node.replace:
-        node.state = node.REMOVED
+    for descendant in postorder(node, _children):
+        if descendant.fingerprint(with_whitespace=unparse_with_whitespace) == text_fingerprint(descendant.replace) \
+                and descendant.unparse(with_whitespace=unparse_with_whitespace) == descendant.replace:
+            descendant.state = descendant.REMOVED
+            descendant.invalidate()
 
     return node
 
@@ -144,12 +163,11 @@ def skip_whitespace(node):
     :param node: The root of the tree to be transformed.
     :return: The root of the transformed tree.
     """
-    if isinstance(node, HDDRule):
-        for child in node.children:
-            skip_whitespace(child)
-    else:
-        assert isinstance(node, HDDToken)
-        if node.text.isspace():
-            node.state = node.REMOVED
+    for descendant in preorder(node, _children):
+        if not isinstance(descendant, HDDRule):
+            assert isinstance(descendant, HDDToken)
+            if descendant.text.isspace():
+                descendant.state = descendant.REMOVED
+                descendant.invalidate()
 
     return node
@@ -0,0 +1,98 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+"""
+Iterative tree traversals. The walkers of HDD trees use an explicit stack
+instead of recursion, so that the depth of the trees is not limited by the
+recursion limit of Python (and no Python frame is needed per tree level).
+"""
+
+
+def walk(root, children):
+    """
+    Traverse a tree in depth-first order, and report both entering and leaving
+    the nodes.
+
+    The children of a node are queried when the node is entered, thus the
+    node may be changed (e.g., its children may be replaced) when it is left.
+
+    :param root: The root of the tree.
+    :param children: Function returning the sequence of the children of a
+        node to descend into (or None or an empty sequence if the node is not
+        to be descended into).
+    :return: Generator of (node, entering) pairs, where entering is True when
+        the node is entered (i.e., before its descendants), and False when it
+        is left (i.e., after its descendants).
+    """
+    stack = [(root, True)]
+    while stack:
+        node, entering = stack.pop()
+        yield node, entering
+        if entering:
+            stack.append((node, False))
+            node_children = children(node)
+            if node_children:
+                stack.extend((child, True) for child in reversed(node_children))
+
+
+def preorder(root, children):
+    """
+    Traverse a tree in pre-order.
+
+    The children of a node are queried after the node is generated, thus the
+    children of the node may be changed by the consumer of the generator.
+
+    :param root: The root of the tree.
+    :param children: Function returning the children of a node to descend into
+        (see walk).
+    :return: Generator of the nodes.
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        node_children = children(node)
+        if node_children:
+            stack.extend(reversed(node_children))
+
+
+def postorder(root, children):
+    """
+    Traverse a tree in post-order.
+
+    :param root: The root of the tree.
+    :param children: Function returning the children of a node to descend into
+        (see walk).
+    :return: Generator of the nodes.
+    """
+    return (node for node, entering in walk(root, children) if not entering)
+
+
+def fold(root, children, combine):
+    """
+    Compute a value for every node of a tree from the values of its children
+    (bottom-up).
+
+    :param root: The root of the tree.
+    :param children: Function returning the children of a node to descend into
+        (see walk).
+    :param combine: Function computing the value of a node from the node and
+        from the list of the values of its children (that were descended
+        into).
+    :return: The value of the root.
+    """
+    values = []
+    bases = []
+    for node, entering in walk(root, children):
+        if entering:
+            bases.append(len(values))
+        else:
+            base = bases.pop()
+            value = combine(node, values[base:])
+            del values[base:]
+            values.append(value)
+    return values[0]
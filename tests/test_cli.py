@@ -5,7 +5,10 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
+import hashlib
 import os
+import shutil
+import sqlite3
 import subprocess
 import sys
 
@@ -36,7 +39,11 @@ antlr = os.getenv('ANTLR')
     ('--no-hdd-star', '--no-skip-unremovable', '--cache=none', ),
     ('--no-hdd-star', '--no-squeeze-tree', '--cache=config', ),
     ('--no-hdd-star', '--no-squeeze-tree', '--no-skip-unremovable', '--parser=java', '--cache=content', ),
+    ('--parser=java', '--island-jobs=2', '--cache=content', ),
+    ('--island-jobs=2', '--cache=content', ),
     ('--parallel', ),
+    ('--compact-tree', '--cache=content', ),
+    ('--parallel', '--cache=content', '--cache-limit=10', ),
 ])
 def test_cli(test, inp, exp, grammar, rule, input_format, args, tmpdir):
     out_dir = str(tmpdir)
@@ -59,3 +66,238 @@ def test_cli(test, inp, exp, grammar, rule, input_format, args, tmpdir):
     with open(os.path.join(resources_dir, exp), 'rb') as expf:
         expb = expf.read()
     assert outb == expb
+
+
+@pytest.mark.parametrize('parser', ['python', 'java'])
+def test_cli_build_cache(parser, tmpdir):
+    test, inp, exp = 'test-json-obj-arr-foo', 'inp-obj-arr.json', 'exp-obj-arr-foo.json'
+    cache_dir = str(tmpdir.join('cache'))
+
+    # The first run populates the cache, the second one reuses it.
+    for run in range(2):
+        out_dir = str(tmpdir.join(f'out{run}'))
+        cmd = (sys.executable, '-m', 'picireny') \
+            + (f'--test={test}{script_ext}', f'--input={inp}', f'--out={out_dir}') \
+            + ('--grammar=JSON.g4', '--start=json', f'--parser={parser}', f'--build-cache={cache_dir}')
+        if antlr:
+            cmd += (f'--antlr={antlr}', )
+        subprocess.run(cmd, cwd=resources_dir, check=True)
+        assert len(os.listdir(cache_dir)) == 1
+
+        with open(os.path.join(out_dir, inp), 'rb') as outf:
+            outb = outf.read()
+        with open(os.path.join(resources_dir, exp), 'rb') as expf:
+            expb = expf.read()
+        assert outb == expb
+
+
+@pytest.mark.parametrize('args', [
+    (),
+    ('--parallel', '--jobs=2', ),
+])
+def test_cli_outcome_store(args, tmpdir):
+    test, inp, exp = 'test-json-obj-arr-87', 'inp-obj-arr.json', 'exp-obj-arr-87-hoist.json'
+    store = str(tmpdir.join('outcomes.db'))
+
+    # The first run populates the store, the second one reuses it and does not
+    # have to execute any tests (except for the sanity checks of the reducer).
+    for run in range(2):
+        out_dir = str(tmpdir.join(f'out{run}'))
+        cmd = (sys.executable, '-m', 'picireny') \
+            + (f'--test={test}{script_ext}', f'--input={inp}', f'--out={out_dir}') \
+            + ('--grammar=JSON.g4', '--start=json', '--phase=prune+hoist', f'--outcome-store={store}', '--no-cleanup')
+        if antlr:
+            cmd += (f'--antlr={antlr}', )
+        cmd += args
+        subprocess.run(cmd, cwd=resources_dir, check=True)
+        if run > 0:
+            assert all('assert' in test_id for test_id in os.listdir(os.path.join(out_dir, 'tests')))
+
+        with open(os.path.join(out_dir, inp), 'rb') as outf:
+            outb = outf.read()
+        with open(os.path.join(resources_dir, exp), 'rb') as expf:
+            expb = expf.read()
+        assert outb == expb
+
+    # The outcomes are stored by the cryptographic digest of the test cases.
+    with sqlite3.connect(store) as db:
+        digest = hashlib.blake2b(expb, digest_size=32).digest()
+        assert db.execute('SELECT outcome FROM outcomes WHERE digest = ?', (digest, )).fetchone() == ('FAIL', )
+
+
+@pytest.mark.parametrize('args', [
+    (),
+    ('--compact-tree', ),
+])
+def test_cli_resume(args, tmpdir):
+    test, inp, exp = 'test-json-obj-arr-foo', 'inp-obj-arr.json', 'exp-obj-arr-foo.json'
+    out_dir = str(tmpdir.join('out'))
+    checkpoint = os.path.join(out_dir, 'checkpoint.pickle')
+
+    # The first run saves its final state, the second one resumes from it and
+    # does not have to execute any tests.
+    for run in range(2):
+        cmd = (sys.executable, '-m', 'picireny') \
+            + (f'--test={test}{script_ext}', f'--input={inp}', f'--out={out_dir}') \
+            + ('--grammar=JSON.g4', '--start=json', '--checkpoint-interval=0', '--no-cleanup')
+        if antlr:
+            cmd += (f'--antlr={antlr}', )
+        if run > 0:
+            cmd += ('--resume', )
+            os.remove(os.path.join(out_dir, inp))
+            shutil.rmtree(os.path.join(out_dir, 'tests'))
+        cmd += args
+        subprocess.run(cmd, cwd=resources_dir, check=True)
+        assert os.path.exists(checkpoint)
+        if run > 0:
+            assert not os.path.exists(os.path.join(out_dir, 'tests'))
+
+        with open(os.path.join(out_dir, inp), 'rb') as outf:
+            outb = outf.read()
+        with open(os.path.join(resources_dir, exp), 'rb') as expf:
+            expb = expf.read()
+        assert outb == expb
+
+
+@pytest.mark.parametrize('test, inp, exp', [
+    ('test-json-obj-arr-foo', 'inp-obj-arr.json', 'exp-obj-arr-foo.json'),
+    ('test-json-obj-arr-bar', 'inp-obj-arr.json', 'exp-obj-arr-bar-hoist.json'),
+    ('test-json-obj-arr-baz', 'inp-obj-arr.json', 'exp-obj-arr-baz.json'),
+    ('test-json-obj-arr-87', 'inp-obj-arr.json', 'exp-obj-arr-87-hoist.json'),
+])
+@pytest.mark.parametrize('args', [
+    ('--phase=prune+hoist', ),
+    ('--phase=prune+hoist', '--parallel', '--jobs=2', ),
+    ('--phase=prune+hoist', '--phase=prune', '--cache=content', ),
+])
+def test_cli_hoist(test, inp, exp, args, tmpdir):
+    out_dir = str(tmpdir)
+    cmd = (sys.executable, '-m', 'picireny') \
+        + (f'--test={test}{script_ext}', f'--input={inp}', f'--out={out_dir}') \
+        + ('--grammar=JSON.g4', '--start=json')
+    if antlr:
+        cmd += (f'--antlr={antlr}', )
+    cmd += args
+    subprocess.run(cmd, cwd=resources_dir, check=True)
+
+    with open(os.path.join(out_dir, inp), 'rb') as outf:
+        outb = outf.read()
+    with open(os.path.join(resources_dir, exp), 'rb') as expf:
+        expb = expf.read()
+    assert outb == expb
+
+
+@pytest.mark.parametrize('args', [
+    (),
+    ('--parser=java', '--batch-jobs=2', ),
+    ('--parallel', '--jobs=4', '--batch-jobs=2', ),
+])
+def test_cli_batch(args, tmpdir):
+    test, inp, exp = 'test-json-obj-arr-foo', 'inp-obj-arr.json', 'exp-obj-arr-foo.json'
+    inputs = ('inp-a.json', 'inp-b.json', 'inp-c.json')
+    in_dir = tmpdir.mkdir('inputs')
+    with open(os.path.join(resources_dir, inp), 'rb') as inf:
+        inb = inf.read()
+    for fn in inputs:
+        in_dir.join(fn).write_binary(inb)
+
+    out_dir = str(tmpdir.join('out'))
+    cmd = (sys.executable, '-m', 'picireny') \
+        + (f'--test={test}{script_ext}', f'--input={in_dir}', f'--out={out_dir}', '--batch') \
+        + ('--grammar=JSON.g4', '--start=json')
+    if antlr:
+        cmd += (f'--antlr={antlr}', )
+    cmd += args
+    subprocess.run(cmd, cwd=resources_dir, check=True)
+
+    with open(os.path.join(resources_dir, exp), 'rb') as expf:
+        expb = expf.read()
+    for fn in inputs:
+        with open(os.path.join(out_dir, fn, fn), 'rb') as outf:
+            outb = outf.read()
+        assert outb == expb
+
+
+def test_cli_batch_failure(tmpdir):
+    test, inp, exp = 'test-json-obj-arr-foo', 'inp-obj-arr.json', 'exp-obj-arr-foo.json'
+    in_dir = tmpdir.mkdir('inputs')
+    with open(os.path.join(resources_dir, inp), 'rb') as inf:
+        in_dir.join('inp-a.json').write_binary(inf.read())
+    # The second input is not interesting, its failure must not stop the batch.
+    in_dir.join('inp-b.json').write_binary(b'[]\n')
+
+    out_dir = str(tmpdir.join('out'))
+    cmd = (sys.executable, '-m', 'picireny') \
+        + (f'--test={test}{script_ext}', f'--input={in_dir}', f'--out={out_dir}', '--batch') \
+        + ('--grammar=JSON.g4', '--start=json')
+    if antlr:
+        cmd += (f'--antlr={antlr}', )
+    result = subprocess.run(cmd, cwd=resources_dir, check=False, stderr=subprocess.PIPE)
+    assert result.returncode == 1
+    assert b'inp-b.json' in result.stderr.splitlines()[-1]
+
+    with open(os.path.join(out_dir, 'inp-a.json', 'inp-a.json'), 'rb') as outf:
+        outb = outf.read()
+    with open(os.path.join(resources_dir, exp), 'rb') as expf:
+        expb = expf.read()
+    assert outb == expb
+
+
+def test_cli_serve(tmpdir):
+    test, inp, exp = 'test-json-obj-arr-foo', 'inp-obj-arr.json', 'exp-obj-arr-foo.json'
+    inputs = ('inp-a.json', 'inp-b.json')
+    spool_dir = tmpdir.mkdir('spool')
+    with open(os.path.join(resources_dir, inp), 'rb') as inf:
+        inb = inf.read()
+    for fn in inputs:
+        spool_dir.join(fn).write_binary(inb)
+
+    # The jobs are submitted before the server starts, and the server stops
+    # when it has nothing to do.
+    out_dir = str(tmpdir.join('out'))
+    cmd = (sys.executable, '-m', 'picireny') \
+        + (f'--test={test}{script_ext}', f'--input={spool_dir}', f'--out={out_dir}') \
+        + ('--serve', '--serve-interval=0.1', '--serve-timeout=1', '--batch-jobs=2') \
+        + ('--grammar=JSON.g4', '--start=json', '--parser=java')
+    if antlr:
+        cmd += (f'--antlr={antlr}', )
+    subprocess.run(cmd, cwd=resources_dir, check=True)
+    assert not os.listdir(str(spool_dir))
+
+    with open(os.path.join(resources_dir, exp), 'rb') as expf:
+        expb = expf.read()
+    for fn in inputs:
+        with open(os.path.join(out_dir, fn, 'status'), 'r') as statusf:
+            assert statusf.read() == 'done\n'
+        with open(os.path.join(out_dir, fn, fn), 'rb') as outf:
+            outb = outf.read()
+        assert outb == expb
+
+
+def test_cli_serve_failure(tmpdir):
+    test, inp, exp = 'test-json-obj-arr-foo', 'inp-obj-arr.json', 'exp-obj-arr-foo.json'
+    spool_dir = tmpdir.mkdir('spool')
+    with open(os.path.join(resources_dir, inp), 'rb') as inf:
+        spool_dir.join('inp-a.json').write_binary(inf.read())
+    # The second job is not interesting, its failure must not stop the server.
+    spool_dir.join('inp-b.json').write_binary(b'[]\n')
+
+    out_dir = str(tmpdir.join('out'))
+    cmd = (sys.executable, '-m', 'picireny') \
+        + (f'--test={test}{script_ext}', f'--input={spool_dir}', f'--out={out_dir}') \
+        + ('--serve', '--serve-interval=0.1', '--serve-timeout=1') \
+        + ('--grammar=JSON.g4', '--start=json')
+    if antlr:
+        cmd += (f'--antlr={antlr}', )
+    subprocess.run(cmd, cwd=resources_dir, check=True)
+    assert not os.listdir(str(spool_dir))
+
+    for fn, status in [('inp-a.json', 'done'), ('inp-b.json', 'failed')]:
+        with open(os.path.join(out_dir, fn, 'status'), 'r') as statusf:
+            assert statusf.read() == f'{status}\n'
+
+    with open(os.path.join(out_dir, 'inp-a.json', 'inp-a.json'), 'rb') as outf:
+        outb = outf.read()
+    with open(os.path.join(resources_dir, exp), 'rb') as expf:
+        expb = expf.read()
+    assert outb == expb
@@ -0,0 +1,107 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import pickle
+
+import pytest
+
+from picireny import Checkpointer, compact_tree, info, load_checkpoint, transform
+from picireny.hdd_tree import HDDRule, HDDToken, Position
+
+
+depth = 100000
+
+
+def deep_tree():
+    # A chain of `depth` rules with a single token at the bottom, like the
+    # tree of a deeply nested expression.
+    root = node = HDDRule('r', start=Position(1, 0), end=Position(1, 1), replace='')
+    for _ in range(depth - 1):
+        child = HDDRule('r', start=Position(1, 0), end=Position(1, 1), replace='')
+        node.add_child(child)
+        node = child
+    node.add_child(HDDToken('t', 'x', start=Position(1, 0), end=Position(1, 1), replace=''))
+    return root
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_deep_tree_walkers(compact):
+    tree = deep_tree()
+    if compact:
+        tree = compact_tree(tree)
+
+    assert tree.unparse() == 'x'
+    assert ''.join(tree.unparse_chunks()) == 'x'
+    assert tree.fingerprint() == tree.children[0].fingerprint()
+
+    assert info.count(tree) == {'HDDRule': depth, 'HDDToken': 1}
+    assert info.height(tree) == depth + 1
+    assert info.shape(tree) == [1] * (depth + 1)
+
+
+@pytest.mark.parametrize('transformation', [
+    transform.remove_empty_nodes,
+    transform.flatten_recursion,
+    transform.skip_unremovable,
+    transform.skip_whitespace,
+    transform.squeeze_tree,
+])
+def test_deep_tree_transformations(transformation):
+    tree = transformation(deep_tree())
+    assert tree.unparse() == 'x'
+
+
+def test_nested_tree_memo():
+    # A chain of rules where every level wraps the text of its child, so that
+    # the memoized texts of the levels are longer and longer.
+    levels = 100
+    root = node = HDDRule('r', start=Position(1, 0), end=Position(1, 1), replace='')
+    for _ in range(levels):
+        child = HDDRule('r', start=Position(1, 0), end=Position(1, 1), replace='')
+        node.add_children([HDDToken('o', '[ab', start=Position(1, 0), end=Position(1, 0), replace=''),
+                           child,
+                           HDDToken('c', 'ab]', start=Position(1, 0), end=Position(1, 0), replace='')])
+        node = child
+    leaf = HDDToken('t', 'x', start=Position(1, 0), end=Position(1, 1), replace='')
+    node.add_child(leaf)
+
+    assert root.unparse() == '[ab' * levels + 'x' + 'ab]' * levels
+    assert ''.join(root.unparse_chunks()) == root.unparse()
+
+    leaf.state = leaf.REMOVED
+    leaf.invalidate()
+    assert root.unparse() == '[ab' * levels + 'ab]' * levels
+
+    copy = pickle.loads(pickle.dumps(root))
+    assert copy._unparsed is None
+    assert copy.unparse() == root.unparse()
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_deep_tree_checkpoint(compact, tmpdir):
+    tree = deep_tree()
+    if compact:
+        tree = compact_tree(tree)
+    path = str(tmpdir.join('checkpoint.pickle'))
+
+    # The state references the deepest node of the tree, which must stay
+    # connected to the loaded tree.
+    node = tree
+    while isinstance(node, HDDRule):
+        node = node.children[0]
+    Checkpointer(path, key='session')(tree, {'queue': [node]})
+    loaded, state = load_checkpoint(path, key='session')
+
+    assert loaded.unparse() == 'x'
+    assert info.height(loaded) == depth + 1
+    node = state['queue'][0]
+    node.state = node.REMOVED
+    node.invalidate()
+    assert loaded.unparse() == ''
+
+    with pytest.raises(ValueError):
+        load_checkpoint(path, key='other')
@@ -0,0 +1,37 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import pytest
+
+from picireny.hdd_tree import HDDRule, HDDToken, Position, text_fingerprint
+
+
+@pytest.mark.parametrize('text1, text2', [
+    ('b1234567A', 'a1234567|'),
+    ('ab', 'ba'),
+    ('a', 'a\0'),
+])
+def test_text_fingerprint_collision(text1, text2):
+    assert text_fingerprint(text1) != text_fingerprint(text2)
+
+
+@pytest.mark.parametrize('texts', [
+    ['b1234567', 'A'],
+    ['', 'a', 'árvíztűrő', '', 'tükörfúrógép' * 20],
+])
+def test_tree_fingerprint(texts):
+    # The fingerprint of a tree must be the fingerprint of its unparsed text,
+    # even though it is computed from the fingerprints of its parts.
+    root = HDDRule('r', start=Position(1, 0), end=Position(1, 0), replace='')
+    column = 0
+    for text in texts:
+        root.add_child(HDDToken('t', text, start=Position(1, column), end=Position(1, column + len(text)), replace=''))
+        column += len(text)
+    root.end = Position(1, column)
+
+    assert root.unparse() == ''.join(texts)
+    assert root.fingerprint() == text_fingerprint(root.unparse())
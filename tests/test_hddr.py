@@ -0,0 +1,80 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import picire
+import pytest
+
+import picireny
+
+from picireny import Checkpointer, hddrmin, hddrmin_steps, load_checkpoint
+from picireny.hdd_tree import HDDRule, HDDToken, Position
+
+
+def build_tree():
+    # r: [x: [a, b], y: [c, z: [d, e]]], with adjacent tokens.
+    column = 0
+
+    def token(text):
+        nonlocal column
+        column += 1
+        return HDDToken(text, text, start=Position(1, column - 1), end=Position(1, column), replace='')
+
+    def rule(name, children):
+        node = HDDRule(name, start=children[0].start, end=children[-1].end, replace='')
+        node.add_children(children)
+        return node
+
+    return rule('r', [rule('x', [token('a'), token('b')]),
+                      rule('y', [token('c'), rule('z', [token('d'), token('e')])])])
+
+
+class ContainsTest:
+    # Interesting if the test case contains all the characters of keep.
+
+    def __init__(self, *, test_builder, keep):
+        self.test_builder = test_builder
+        self.keep = keep
+
+    def __call__(self, config, config_id):
+        test = self.test_builder(config)
+        return picire.Outcome.FAIL if all(c in test for c in self.keep) else picire.Outcome.PASS
+
+
+@pytest.mark.parametrize('pop_first', [False, True])
+@pytest.mark.parametrize('append_reversed', [False, True])
+def test_hddrmin_steps(pop_first, append_reversed):
+    config = {'reduce_class': picire.DD, 'reduce_config': {},
+              'tester_class': ContainsTest, 'tester_config': {'keep': 'ce'},
+              'pop_first': pop_first, 'append_reversed': append_reversed}
+    expected = hddrmin(build_tree(), **config).unparse()
+    assert expected == 'ce'
+
+    steps = list(hddrmin_steps(build_tree(), **config))
+    assert len(steps) > 1
+    assert steps[-1].unparse() == expected
+
+
+@pytest.mark.parametrize('hddmin', [picireny.hddmin, hddrmin])
+def test_reduce_resume(hddmin, tmpdir):
+    # Save every state of a reduction session, and resume the session from each
+    # of them: the result must be the same as that of the uninterrupted session.
+    config = {'hddmin': hddmin, 'reduce_class': picire.DD, 'reduce_config': {},
+              'tester_class': ContainsTest, 'tester_config': {'keep': 'ce'},
+              'squeeze_tree': False, 'skip_unremovable': False}
+    paths = []
+
+    def checkpoint(hdd_tree, state):
+        paths.append(str(tmpdir.join(f'checkpoint{len(paths)}.pickle')))
+        Checkpointer(paths[-1], key='session')(hdd_tree, state)
+
+    expected = picireny.reduce(build_tree(), checkpoint=checkpoint, **config).unparse()
+    assert expected == 'ce'
+    assert len(paths) > 1
+
+    for path in paths:
+        hdd_tree, state = load_checkpoint(path, key='session')
+        assert picireny.reduce(hdd_tree, resume=state, **config).unparse() == expected
@@ -0,0 +1,72 @@
+# Copyright (c) 2024 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import os
+
+import antlerinator
+import pytest
+
+import picireny
+
+from picireny.hdd_tree import HDDRule
+from picireny.traversal import preorder
+
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+resources_dir = os.path.join(tests_dir, 'resources')
+antlr = os.getenv('ANTLR')
+
+
+def json_format():
+    return {'': {'files': [os.path.join(resources_dir, 'JSON.g4')], 'islands': {}, 'replacements': {}}}
+
+
+def inijson_format():
+    return {
+        'ini': {
+            'files': [os.path.join(resources_dir, 'INILexer.g4'), os.path.join(resources_dir, 'INIParser.g4')],
+            'islands': {'VALUE': '(?P<json:json>.*)'},
+            'replacements': {'EOL': '\n', 'HEADER': 'a', 'KEY': 'a', 'VALUE': 'a'},
+        },
+        'json': {'files': [os.path.join(resources_dir, 'JSON.g4')], 'islands': {}, 'replacements': {}},
+    }
+
+
+def dump_tree(tree):
+    # Everything but the IDs of the nodes, in preorder.
+    def _position(position):
+        return (position.line, position.column) if position is not None else None
+
+    def _children(node):
+        return node.children if isinstance(node, HDDRule) else None
+
+    return [(type(node).__name__, node.name, getattr(node, 'text', None), node.replace,
+             _position(node.start), _position(node.end), len(node.children) if isinstance(node, HDDRule) else None)
+            for node in preorder(tree, _children)]
+
+
+@pytest.mark.parametrize('inp, input_format, start', [
+    ('inp-obj-arr.json', json_format, 'json'),
+    ('inp-str-arr.ini', inijson_format, 'ini:ini'),
+])
+@pytest.mark.parametrize('hidden_tokens', [False, True])
+@pytest.mark.parametrize('island_jobs', [1, 2])
+def test_java_parser(inp, input_format, start, hidden_tokens, island_jobs, tmpdir):
+    # The tree decoded from the output of the Java parser must be the same as
+    # the tree built by the Python parser.
+    with open(os.path.join(resources_dir, inp), 'r') as f:
+        src = f.read()
+
+    trees = {}
+    for lang in ('python', 'java'):
+        trees[lang] = picireny.build_with_antlr4(src, input_format=input_format(), start=start,
+                                                 antlr=antlr or antlerinator.download(lazy=True), lang=lang, build_hidden_tokens=hidden_tokens,
+                                                 work_dir=str(tmpdir.join(lang)),
+                                                 island_jobs=island_jobs if lang == 'java' else 1)
+
+    assert trees['java'].unparse() == trees['python'].unparse()
+    assert dump_tree(trees['java']) == dump_tree(trees['python'])